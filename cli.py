@@ -0,0 +1,315 @@
+import argparse
+import multiprocessing
+import sys
+import tempfile
+
+from utils import DataLoader
+from utils.UnmatchedReport import DEFAULT_REPORT_PATH, read_report
+
+
+def cmd_unmatched(args):
+    """查看未匹配SKU的标题报告"""
+    if args.data_path:
+        data_loader = DataLoader(args.data_path)
+        data_loader.get_sku_from_title()
+        report_df = data_loader.unmatched_report.to_dataframe()
+    else:
+        report_df = read_report(args.report)
+        if report_df is None:
+            print(f"报告不存在: {args.report}")
+            return
+
+    if report_df.empty:
+        print("所有标题均已匹配SKU")
+        return
+    print(report_df.head(args.top).to_string(index=False))
+    print(f"\n共 {len(report_df)} 个未匹配标题，{report_df['出现次数'].sum()} 行")
+
+
+def cmd_suggest(args):
+    """从已保存的标题索引中查找与给定标题最相似的已知标题"""
+    import time
+
+    from utils.SessionManifest import get_cache_dir
+    from utils.TitleIndex import INDEX_FILE_NAME, TitleNgramIndex
+
+    index = TitleNgramIndex.load(get_cache_dir(args.data_path) / INDEX_FILE_NAME)
+    if not len(index):
+        print("标题索引为空，请先加载一次数据")
+        return
+    for title in args.titles:
+        start = time.perf_counter()
+        results = index.query(title, args.top)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{title}  （{len(index)} 个已知标题，耗时 {elapsed:.3f} ms）")
+        if not results:
+            print("  没有相似的已知标题")
+        for sku, similar_title, score in results:
+            print(f"  {sku}\t{score}\t{similar_title}")
+
+
+def cmd_loadtest(args):
+    """并发模拟多个分析人员操作应用，统计重新运行耗时和内存"""
+    from utils.LoadTest import (
+        generate_synthetic_dataset,
+        run_load_test,
+        run_server_load_test,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = args.data_path or generate_synthetic_dataset(
+            tmp_dir, args.sessions, args.rows
+        )
+        if args.mode == "server":
+            print(f"服务模式：{args.users} 个会话同时操作同一个 Streamlit 服务，共用缓存和进程\n")
+            summary, memory, errors = run_server_load_test(
+                data_path, args.users, args.rounds, args.seed, args.url
+            )
+        else:
+            print(
+                f"独立进程模式：{args.users} 个用户各自运行一个应用实例，缓存不共用，"
+                "衡量单个用户的独立成本\n"
+            )
+            summary, memory, errors = run_load_test(
+                data_path, args.users, args.rounds, args.seed
+            )
+
+    print(summary.to_string(index=False))
+    if memory:
+        print("\n" + "，".join(f"{k}: {v}" for k, v in memory.items()))
+    if errors:
+        print(f"\n运行中出现 {len(errors)} 个异常:")
+        for error in errors[:10]:
+            print(f"  {error}")
+
+    if args.max_cpu_p95 and args.mode == "server":
+        print("\n服务模式下各会话共用服务进程的CPU，不统计单次运行的CPU耗时，--max-cpu-p95 不生效")
+    overall = summary.loc[summary["步骤"] == "全部"].iloc[0]
+    exceeded = [
+        f"{column} {overall[column]}ms 超过上限 {limit}ms"
+        for column, limit in (("p95(ms)", args.max_p95), ("CPU p95(ms)", args.max_cpu_p95))
+        if limit and overall[column] > limit
+    ]
+    for message in exceeded:
+        print(f"\n{message}")
+    if errors or exceeded:
+        sys.exit(1)
+
+
+def cmd_aggcheck(args):
+    """对比分区并行聚合与对合并后完整数据 groupby 的结果，要求逐位一致"""
+    import pandas as pd
+    from utils.SkuAggregator import aggregate_partitioned
+
+    data_loader = DataLoader(args.data_path)
+    data_loader.get_sku_from_title()
+    data_loader.clean_data()
+    data_loader.aggregate_by_sku()
+    expected = data_loader.aggregated_df
+
+    failed = False
+    for workers in args.workers:
+        result = aggregate_partitioned(data_loader.session_data.values(), max_workers=workers)
+        try:
+            pd.testing.assert_frame_equal(expected, result, check_exact=True)
+            print(f"{workers} 个进程: 一致（{len(result)} 个SKU）")
+        except AssertionError as e:
+            failed = True
+            print(f"{workers} 个进程: 不一致\n{e}")
+    if failed:
+        sys.exit(1)
+
+
+def _memory_worker(mode, data_path, shared_dir, barrier, results):
+    """工作进程：打开数据后等待所有进程就绪，再统计本进程内存"""
+    from utils.SharedDataset import get_memory_usage
+
+    baseline = get_memory_usage()
+    if mode == "shared":
+        data_loader = DataLoader.from_shared_dataset(shared_dir)
+    else:
+        data_loader = DataLoader(data_path)
+        data_loader.get_sku_from_title()
+        data_loader.clean_data()
+        data_loader.aggregate_by_sku()
+    # 所有进程同时持有数据时，PSS 才能反映共享页面的分摊
+    barrier.wait()
+    usage = get_memory_usage()
+    results.put(
+        {
+            "模式": "共享映射" if mode == "shared" else "独立加载",
+            "行数": len(data_loader.df),
+            **{k: usage[k] for k in ("RSS", "PSS", "USS")},
+            "数据USS增量": round(usage["USS"] - baseline["USS"], 1),
+        }
+    )
+    barrier.wait()
+
+
+def _measure_workers(mode, data_path, shared_dir, workers):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_memory_worker, args=(mode, data_path, shared_dir, barrier, results)
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+
+def cmd_share(args):
+    """写出可内存映射的共享数据集，并统计多个进程打开后的内存（MB）"""
+    import pandas as pd
+    from utils import get_default_engine
+    from utils.SharedDataset import get_shared_dir, is_shared_dataset_fresh
+
+    shared_dir = args.output or get_shared_dir(args.data_path)
+    if args.rebuild or not is_shared_dataset_fresh(
+        shared_dir, args.data_path, get_default_engine().version
+    ):
+        data_loader = DataLoader(args.data_path)
+        data_loader.get_sku_from_title()
+        data_loader.clean_data()
+        data_loader.aggregate_by_sku()
+        data_loader.export_shared_dataset(shared_dir)
+    print(f"共享数据集: {shared_dir}")
+
+    if args.workers:
+        modes = ["shared", "copy"] if args.compare else ["shared"]
+        rows = [
+            row
+            for mode in modes
+            for row in _measure_workers(mode, args.data_path, shared_dir, args.workers)
+        ]
+        report = pd.DataFrame(rows)
+        print(report.to_string(index=False))
+        print("\n各模式平均:")
+        print(report.groupby("模式", sort=False)[["RSS", "PSS", "USS", "数据USS增量"]].mean().round(1).to_string())
+
+
+def cmd_snapshot(args):
+    """保存、列出和对比数据版本快照"""
+    from utils.SnapshotStore import SnapshotStore, summarize_diff
+
+    store = SnapshotStore.for_data_path(args.data_path)
+    if args.action == "save":
+        data_loader = DataLoader(args.data_path)
+        data_loader.get_sku_from_title()
+        data_loader.clean_data()
+        data_loader.aggregate_by_sku()
+        meta = store.save(data_loader, label=args.label)
+        print(f"快照: {meta['id']}，{len(meta['sessions'])} 场，{meta['rows']} 行，{meta['skus']} 个SKU")
+        return
+
+    snapshots = store.list_snapshots()
+    if args.action == "list":
+        if not snapshots:
+            print("没有快照")
+        for meta in snapshots:
+            print(
+                f"{meta['id']}  {meta['created']}  {len(meta['sessions'])}场  "
+                f"{meta['rows']}行  {meta['skus']}个SKU  {meta.get('label', '')}"
+            )
+        return
+
+    # diff：默认对比最新的两个快照
+    ids = [meta["id"] for meta in snapshots]
+    new_id = args.new or (ids[0] if ids else None)
+    old_id = args.old or (ids[1] if len(ids) > 1 else None)
+    if old_id not in ids or new_id not in ids:
+        print("需要两个存在的快照，可用 list 查看")
+        return
+    diff = store.diff(old_id, new_id)
+    print(f"{old_id} → {new_id}")
+    print("，".join(f"{k}: {v}" for k, v in summarize_diff(diff).items()))
+    changed = diff["skus"][diff["skus"]["状态"] != "未变"]
+    if not changed.empty:
+        print(changed.head(args.top).to_string(index=False))
+    if not diff["mapping"].empty:
+        print("\n标题映射变化:")
+        print(diff["mapping"].head(args.top).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直播数据分析命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    unmatched = subparsers.add_parser("unmatched", help="查看未匹配SKU的标题")
+    unmatched.add_argument(
+        "data_path", nargs="?", help="数据文件或文件夹，不指定则读取最近一次的报告"
+    )
+    unmatched.add_argument("--report", default=DEFAULT_REPORT_PATH, help="报告文件路径")
+    unmatched.add_argument("--top", type=int, default=50, help="最多显示的条数")
+    unmatched.set_defaults(func=cmd_unmatched)
+
+    suggest = subparsers.add_parser("suggest", help="查找与标题最相似的已知SKU标题")
+    suggest.add_argument("data_path", help="数据文件夹（读取其中 .cache 下的标题索引）")
+    suggest.add_argument("titles", nargs="+", help="要查询的商品标题")
+    suggest.add_argument("--top", type=int, default=5, help="返回的候选数量")
+    suggest.set_defaults(func=cmd_suggest)
+
+    loadtest = subparsers.add_parser("loadtest", help="并发压力测试")
+    loadtest.add_argument(
+        "data_path", nargs="?", help="数据文件夹，不指定则生成合成数据"
+    )
+    loadtest.add_argument(
+        "--mode",
+        choices=["server", "process"],
+        default="server",
+        help="server: 多个会话连接同一个服务；process: 每个用户一个独立进程",
+    )
+    loadtest.add_argument("--url", help="服务模式下连接已运行的服务（如 http://localhost:8501），不指定则自动启动")
+    loadtest.add_argument("--users", type=int, default=4, help="并发用户数")
+    loadtest.add_argument("--rounds", type=int, default=2, help="每个用户的操作轮数")
+    loadtest.add_argument("--sessions", type=int, default=10, help="合成数据的场次数")
+    loadtest.add_argument("--rows", type=int, default=200, help="合成数据每场的行数")
+    loadtest.add_argument("--seed", type=int, default=0, help="随机种子")
+    loadtest.add_argument(
+        "--max-p95", type=float, help="p95耗时上限（毫秒），超过时以非零状态退出"
+    )
+    loadtest.add_argument(
+        "--max-cpu-p95",
+        type=float,
+        help="单次运行CPU耗时的p95上限（毫秒，仅独立进程模式），不受并发用户数和CPU核数影响",
+    )
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    aggcheck = subparsers.add_parser("aggcheck", help="检查分区并行聚合与完整数据聚合的结果一致")
+    aggcheck.add_argument("data_path", help="数据文件或文件夹")
+    aggcheck.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4], help="要检查的进程数"
+    )
+    aggcheck.set_defaults(func=cmd_aggcheck)
+
+    share = subparsers.add_parser("share", help="写出内存映射的共享数据集并统计各进程内存")
+    share.add_argument("data_path", help="数据文件夹")
+    share.add_argument("--output", help="共享数据集目录，默认为数据文件夹下的 .cache/shared")
+    share.add_argument("--rebuild", action="store_true", help="即使数据未变化也重新写出")
+    share.add_argument("--workers", type=int, default=0, help="同时打开数据集的进程数")
+    share.add_argument(
+        "--compare", action="store_true", help="同时统计每个进程独立加载Excel时的内存"
+    )
+    share.set_defaults(func=cmd_share)
+
+    snapshot = subparsers.add_parser("snapshot", help="数据版本快照")
+    snapshot.add_argument("action", choices=["save", "list", "diff"], help="保存、列出或对比快照")
+    snapshot.add_argument("data_path", help="数据文件夹")
+    snapshot.add_argument("--label", help="快照备注（save）")
+    snapshot.add_argument("--old", help="旧版本ID（diff），默认为倒数第二个快照")
+    snapshot.add_argument("--new", help="新版本ID（diff），默认为最新快照")
+    snapshot.add_argument("--top", type=int, default=30, help="最多显示的条数")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,37 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+import pandas as pd
 import os
-from utils import DataLoader, logger
+import math
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from pathlib import Path
+import numpy as np
+from utils import DataLoader, SessionIndex, logger, get_default_engine
+from utils.RollupStore import GRANULARITIES
+from utils.WorkbookReader import read_workbook_sheets, workbook_sessions
+from utils.SnapshotStore import (
+    STATUS_ADDED,
+    STATUS_CHANGED,
+    STATUS_REMOVED,
+    STATUS_UNCHANGED,
+    SnapshotStore,
+    summarize_diff,
+)
+from utils.SharedDataset import (
+    DATASET_FILE_NAME,
+    get_memory_usage,
+    get_shared_dir,
+    is_shared_dataset_fresh,
+)
+from utils.SessionManifest import SessionManifest
+from utils.FigureCache import FigureCache
+from utils.LruCache import LruCache
+from utils.Profiler import RerunProfiler, describe_dataset
+from utils.DeltaEngine import compute_metric_deltas, delta_leaderboard
+from utils.AnomalyDetector import ANOMALY_METRICS, detect_anomalies
 from pyecharts import options as opts
 from pyecharts.charts import Line
 from pyecharts.globals import ThemeType
@@ -17,27 +46,335 @@ st.set_page_config(
 )
 
 
+# 场次数量超过该值时，按场次分区多进程聚合
+PARALLEL_AGGREGATE_SESSIONS = 200
+# 上传文件超过该大小时在工作进程中解析
+LARGE_UPLOAD_BYTES = 2 * 1024 * 1024
+# 最多缓存的上传文件解析结果数量
+MAX_CACHED_UPLOADS = 64
+# 聚合分析图表缓存的最大数量
+FIGURE_CACHE_SIZE = 64
+# 共享数据集模式：清理后的数据写成 Arrow 文件，同一主机上的多个进程内存映射同一份数据
+SHARED_DATASET_MODE = os.environ.get("SHARED_DATASET") == "1"
+# 性能分析模式：每次页面运行都保存性能分析文件到 logs/
+PROFILE_RERUN_MODE = os.environ.get("PROFILE_RERUN") == "1"
+# 侧边栏请求分析下一次运行时写入的会话状态
+PROFILE_STATE_KEY = "profile_next_rerun"
+
+
 # 缓存数据加载函数
 @st.cache_data
-def load_and_process_data(data_source, source_type="folder"):
-    """加载和处理数据"""
+def load_and_process_data(
+    data_source, source_type="folder", rules_version=None, date_range=None
+):
+    """
+    加载和处理数据
+    rules_version: 用于在SKU规则文件变化后使缓存失效
+    date_range: 只加载该日期范围内的场次
+    """
     try:
         if source_type == "folder":
-            data_loader = DataLoader(data_source)
+            data_loader = DataLoader(data_source, date_range=date_range)
         elif source_type == "file_list":
-            data_loader = DataLoader(data_source)
+            data_loader = DataLoader(data_source, date_range=date_range)
         else:
-            data_loader = DataLoader(data_source)
+            data_loader = DataLoader(data_source, date_range=date_range)
 
         data_loader.get_sku_from_title()
-        data_loader.clean_data()
-        data_loader.aggregate_by_sku()
+        if len(data_loader.session_data) >= PARALLEL_AGGREGATE_SESSIONS:
+            # 场次较多时不合并完整数据，按场次分区聚合
+            data_loader.clean_data(combine=False)
+            data_loader.aggregate_by_sku(workers=os.cpu_count())
+        else:
+            data_loader.clean_data()
+            data_loader.aggregate_by_sku()
+        # 完整加载文件夹时保存版本快照，用于对比不同构建之间的变化
+        if date_range is None and os.path.isdir(data_source):
+            try:
+                SnapshotStore.for_data_path(data_source).save(data_loader)
+            except Exception as e:
+                logger.error(f"保存数据快照失败: {e}")
         return data_loader
     except Exception as e:
         logger.error(f"数据加载失败: {e}")
         return None
 
 
+@st.cache_resource(max_entries=4)
+def open_shared_dataset(shared_dir, dataset_mtime_ns):
+    """
+    内存映射打开共享数据集；使用 cache_resource 返回同一个对象，不序列化复制
+    dataset_mtime_ns: 数据集文件的修改时间，重新写出后使缓存失效
+    """
+    return DataLoader.from_shared_dataset(shared_dir)
+
+
+def uncached(func, cached=True):
+    """cached 为 False 时返回未加缓存的原函数：只绕过这一次调用的缓存，不清除其他用户共享的缓存"""
+    return func if cached else func.__wrapped__
+
+
+def load_shared_data(data_source, rules_version=None, date_range=None, cached=True):
+    """
+    共享数据集模式下加载文件夹数据：数据集过期时由当前进程重新写出，其他进程直接打开
+    cached: 为 False 时不使用缓存，重新打开数据集（用于不带缓存的性能分析）
+    """
+    load = uncached(load_and_process_data, cached)
+    shared_dir = get_shared_dir(data_source, date_range)
+    try:
+        if not is_shared_dataset_fresh(shared_dir, data_source, rules_version, date_range):
+            data_loader = load(data_source, "folder", rules_version, date_range)
+            if data_loader is None:
+                return None
+            data_loader.export_shared_dataset(shared_dir)
+        dataset_path = shared_dir / DATASET_FILE_NAME
+        return uncached(open_shared_dataset, cached)(
+            str(shared_dir), dataset_path.stat().st_mtime_ns
+        )
+    except Exception as e:
+        logger.error(f"共享数据集加载失败，改为独立加载: {e}")
+        return load(data_source, "folder", rules_version, date_range)
+
+
+@st.cache_resource
+def get_figure_cache():
+    """聚合分析图表缓存，所有会话共享"""
+    return FigureCache(max_entries=FIGURE_CACHE_SIZE)
+
+
+@st.cache_resource
+def get_upload_cache():
+    """上传文件解析结果缓存：内容哈希 -> {工作表名称: 原始数据}，所有会话共享"""
+    return LruCache(max_entries=MAX_CACHED_UPLOADS)
+
+
+def parse_uploaded_files(uploaded_files):
+    """
+    在内存中解析上传的文件，按内容哈希缓存，重复上传同一文件无需重新解析
+    较大的文件在工作进程中并行解析
+    返回 ((文件名, 内容哈希), ...) 和 {内容哈希: {工作表名称: 原始数据}}
+    """
+    cache = get_upload_cache()
+    upload_keys = []
+    frames = {}  # 本次上传的解析结果，不受缓存淘汰影响
+    pending = {}
+    for uploaded_file in uploaded_files:
+        content = uploaded_file.getvalue()
+        content_hash = hashlib.sha256(content).hexdigest()
+        upload_keys.append((Path(uploaded_file.name).stem, content_hash))
+        sheets = cache.get(content_hash)
+        if sheets is not None:
+            frames[content_hash] = sheets
+        else:
+            pending[content_hash] = (uploaded_file.name, content)
+
+    large = {h: item for h, item in pending.items() if len(item[1]) >= LARGE_UPLOAD_BYTES}
+    failed = set()
+    for content_hash, (file_name, content) in pending.items():
+        if content_hash in large:
+            continue
+        try:
+            frames[content_hash] = read_workbook_sheets(content)
+        except Exception as e:
+            logger.error(f"解析上传文件失败 {file_name}: {e}")
+            failed.add(content_hash)
+
+    if large:
+        progress = st.sidebar.progress(0.0, text=f"正在解析 {len(large)} 个较大的文件...")
+        with ProcessPoolExecutor(max_workers=min(len(large), os.cpu_count() or 1)) as executor:
+            futures = {
+                # 已在工作进程中，工作表不再分进程解析
+                executor.submit(read_workbook_sheets, content, None, 1): (
+                    content_hash,
+                    file_name,
+                )
+                for content_hash, (file_name, content) in large.items()
+            }
+            for i, future in enumerate(as_completed(futures)):
+                content_hash, file_name = futures[future]
+                try:
+                    frames[content_hash] = future.result()
+                except Exception as e:
+                    logger.error(f"解析上传文件失败 {file_name}: {e}")
+                    failed.add(content_hash)
+                progress.progress((i + 1) / len(futures))
+        progress.empty()
+
+    for content_hash in failed:
+        file_name = pending[content_hash][0]
+        st.sidebar.error(f"无法解析文件: {file_name}")
+
+    for content_hash in pending:
+        if content_hash in frames:
+            cache.put(content_hash, frames[content_hash])
+
+    upload_keys = tuple(key for key in upload_keys if key[1] not in failed)
+    return upload_keys, {content_hash: frames[content_hash] for _, content_hash in upload_keys}
+
+
+@st.cache_data(max_entries=8)
+def load_with_uploads(
+    data_source,
+    source_type,
+    rules_version,
+    date_range,
+    upload_keys,
+    _upload_frames,
+    _cached=True,
+):
+    """
+    在已加载的数据上增量合并上传的文件
+    upload_keys: ((文件名, 内容哈希), ...)，作为缓存键；_upload_frames 为对应的各工作表原始数据
+    多工作表文件的每个工作表作为一个场次
+    _cached: 为 False 时已加载的数据也不使用缓存（与 uncached 一起使用）
+    """
+    if data_source:
+        data_loader = uncached(load_and_process_data, _cached)(
+            data_source, source_type, rules_version, date_range
+        )
+        if data_loader is None:
+            return None
+    else:
+        data_loader = DataLoader(None)
+    try:
+        data_loader.add_uploaded_sessions(
+            [
+                session
+                for name, h in upload_keys
+                for session in workbook_sessions(name, h, _upload_frames[h])
+            ]
+        )
+    except Exception as e:
+        logger.error(f"合并上传文件失败: {e}")
+        return None
+    return data_loader
+
+
+def select_date_range(data_folder):
+    """侧边栏日期范围选择，只解析文件名和场次摘要中记录的日期，不读取文件"""
+    session_index = SessionManifest.for_data_path(data_folder).apply_cached_dates(
+        SessionIndex.from_directory(data_folder)
+    )
+    first_date, last_date = session_index.date_bounds()
+    if first_date is None:
+        return None
+
+    range_mode = st.sidebar.radio(
+        "日期范围",
+        options=["全部场次", "最近N天", "自定义"],
+        horizontal=True,
+        help="只加载所选日期范围内的场次文件，范围外的文件不会被读取",
+    )
+
+    if range_mode == "最近N天":
+        days = st.sidebar.number_input(
+            "最近天数", min_value=1, value=30, help="以最新场次的日期为终点向前计算"
+        )
+        return (last_date - timedelta(days=int(days) - 1), last_date)
+
+    if range_mode == "自定义":
+        selected_dates = st.sidebar.date_input(
+            "选择日期范围",
+            value=(first_date, last_date),
+            min_value=first_date,
+            max_value=last_date,
+        )
+        # 只选择了开始日期时，结束日期取最新场次
+        if len(selected_dates) == 2:
+            return tuple(selected_dates)
+        return (selected_dates[0], last_date)
+
+    return None
+
+
+def display_paginated_table(df, key, highlight_index=None, height=None):
+    """
+    服务端分页表格：排序和分页在服务端完成，只把当前页发送到浏览器
+    key: 控件key前缀，同一页面中的多个表格需要不同的key
+    highlight_index: 需要高亮的行索引，按当前页向量化计算高亮样式
+    """
+    total_rows = len(df)
+    index_name = df.index.name
+    sort_options = ["保持当前顺序"]
+    if index_name:
+        sort_options.append(index_name)
+    sort_options += [str(col) for col in df.columns]
+
+    ctrl1, ctrl2, ctrl3, ctrl4 = st.columns([2, 1, 1, 1])
+    with ctrl1:
+        sort_by = st.selectbox("排序列", options=sort_options, key=f"{key}_sort_by")
+    with ctrl2:
+        sort_desc = st.toggle("降序", key=f"{key}_sort_desc")
+    with ctrl3:
+        page_size = st.selectbox(
+            "每页行数", options=[20, 50, 100, 200], index=1, key=f"{key}_page_size"
+        )
+    n_pages = max(1, math.ceil(total_rows / page_size))
+    with ctrl4:
+        page = st.number_input(
+            "页码", min_value=1, max_value=n_pages, value=1, key=f"{key}_page"
+        )
+
+    # 服务端排序
+    if sort_by == index_name and index_name:
+        df = df.sort_index(ascending=not sort_desc)
+    elif sort_by != "保持当前顺序":
+        column = df.columns[[str(col) for col in df.columns].index(sort_by)]
+        df = df.sort_values(by=column, ascending=not sort_desc)
+
+    start = (int(page) - 1) * page_size
+    page_df = df.iloc[start : start + page_size]
+
+    # 高亮：对当前页计算布尔掩码，一次生成整页样式
+    if highlight_index is not None:
+        mask = page_df.index.isin(highlight_index)
+        styles = pd.DataFrame(
+            np.broadcast_to(
+                np.where(mask, "background-color: #e6f3ff", "")[:, None], page_df.shape
+            ),
+            index=page_df.index,
+            columns=page_df.columns,
+        )
+        page_df = page_df.style.apply(lambda _: styles, axis=None)
+
+    if height:
+        st.dataframe(page_df, use_container_width=True, height=height)
+    else:
+        st.dataframe(page_df, use_container_width=True)
+    st.caption(
+        f"第 {int(page)}/{n_pages} 页，显示第 {min(start + 1, total_rows)}-"
+        f"{min(start + page_size, total_rows)} 行，共 {total_rows} 行"
+    )
+
+
+@st.cache_resource(max_entries=4)
+def load_delta_inputs(data_version, _data_loader):
+    """
+    按数据版本缓存变化榜使用的场次透视表和SKU出现情况，调整榜单参数时不重新计算
+    结果只读，使用 cache_resource 避免每次运行复制
+    """
+    comparison_data = _data_loader.get_session_comparison_data()
+    if not comparison_data:
+        return comparison_data, None
+    # 求和类指标的矩阵中，SKU未出现的场次为NaN
+    matrix = _data_loader.get_metric_matrices(["商品点击人数"]).get("商品点击人数")
+    return comparison_data, None if matrix is None else matrix.notna()
+
+
+@st.cache_resource(max_entries=16)
+def compute_delta_tables(data_version, metric, window, _data_loader):
+    """按数据版本、指标和滚动窗口缓存变化计算结果，只调整榜单数量或对比场次时直接复用"""
+    comparison_data, presence = load_delta_inputs(data_version, _data_loader)
+    return compute_metric_deltas(comparison_data[metric], window, presence)
+
+
+@st.cache_data(max_entries=16)
+def compute_anomalies(data_version, _data_loader, threshold, min_history):
+    """按数据版本缓存异常检测结果，数据不变时不会重复计算"""
+    matrices = _data_loader.get_metric_matrices(ANOMALY_METRICS)
+    return detect_anomalies(matrices, threshold=threshold, min_history=min_history)
+
+
 def create_trend_chart(comparison_data, metric, title):
     """创建SKU趋势折线图 - 使用pyecharts"""
     if metric not in comparison_data:
@@ -348,28 +685,331 @@ def display_session_comparison(data_loader):
                 pivot_data = comparison_data[metric]
 
                 # 如果筛选了SKU，高亮显示选中的行
-                if len(selected_skus) < len(unique_skus):
-                    # 创建样式化的DataFrame
-                    styled_df = pivot_data.style.apply(
-                        lambda x: [
-                            (
-                                "background-color: #e6f3ff"
-                                if x.name in selected_skus
-                                else ""
-                            )
-                            for _ in x
-                        ],
-                        axis=1,
-                    )
-                    st.dataframe(styled_df, use_container_width=True)
-                else:
-                    st.dataframe(pivot_data, use_container_width=True)
+                display_paginated_table(
+                    pivot_data,
+                    key=f"comparison_{metric}",
+                    highlight_index=(
+                        selected_skus if len(selected_skus) < len(unique_skus) else None
+                    ),
+                )
+
+
+def display_delta_leaderboard(data_loader):
+    """显示场次环比变化榜：增长/下降最多的SKU和排名变化"""
+    data_version = data_loader.data_version
+    comparison_data, _ = load_delta_inputs(data_version, data_loader)
+    if not comparison_data:
+        st.warning("无法生成对比数据")
+        return None
+
+    session_names = list(next(iter(comparison_data.values())).columns)
+    if len(session_names) < 2:
+        st.warning("至少需要两个场次才能计算变化")
+        return None
+
+    st.sidebar.subheader("📉 变化榜配置")
+    metric = st.sidebar.selectbox("变化指标", options=list(comparison_data))
+    # 第一场没有上一场可比，默认选择最新场次
+    target_session = st.sidebar.selectbox(
+        "对比场次", options=session_names[1:], index=len(session_names) - 2
+    )
+    window = st.sidebar.slider(
+        "滚动均值窗口（场）", min_value=2, max_value=max(2, len(session_names)), value=min(3, len(session_names))
+    )
+    top_n = st.sidebar.slider("榜单数量", min_value=5, max_value=50, value=10)
+
+    deltas = compute_delta_tables(data_version, metric, window, data_loader)
+    board = delta_leaderboard(deltas, target_session)
+    previous_session = session_names[session_names.index(target_session) - 1]
+
+    st.subheader(f"📉 {metric} 变化榜")
+    st.info(f"{target_session} 对比 {previous_session}，共 {len(board)} 个SKU")
 
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**📈 增长最多**")
+        gainers = board[board["变化量"] > 0].nlargest(top_n, "变化量")
+        st.dataframe(gainers, use_container_width=True)
+    with col2:
+        st.write("**📉 下降最多**")
+        losers = board[board["变化量"] < 0].nsmallest(top_n, "变化量")
+        st.dataframe(losers, use_container_width=True)
+
+    movers = pd.concat([gainers, losers]).sort_values("变化量")
+    if not movers.empty:
+        fig_movers = px.bar(
+            movers.reset_index(),
+            x="变化量",
+            y="SKU",
+            orientation="h",
+            color="变化量",
+            color_continuous_scale="RdYlGn",
+            title=f"{metric} 变化量 ({target_session} vs {previous_session})",
+        )
+        fig_movers.update_layout(yaxis_type="category")
+        st.plotly_chart(fig_movers, use_container_width=True)
+
+    col3, col4 = st.columns(2)
+    with col3:
+        st.write("**⬆️ 排名上升最多**")
+        st.dataframe(
+            board[board["排名变化"] > 0].nlargest(top_n, "排名变化"),
+            use_container_width=True,
+        )
+    with col4:
+        st.write("**⬇️ 排名下降最多**")
+        st.dataframe(
+            board[board["排名变化"] < 0].nsmallest(top_n, "排名变化"),
+            use_container_width=True,
+        )
 
-def display_single_session_analysis(data_loader, selected_session):
-    """显示单场数据分析"""
-    session_data = data_loader.get_session_data(selected_session)
-    if session_data is None or session_data.empty:
+    st.write("**完整变化榜**")
+    display_paginated_table(board, key="delta_board_table")
+    return board.reset_index()
+
+
+def display_anomalies(data_loader):
+    """显示最新一场明显偏离自身历史的SKU"""
+    session_names = data_loader.get_session_names()
+    if len(session_names) < 2:
+        st.warning("至少需要两个场次才能检测异常")
+        return None
+
+    st.sidebar.subheader("🚨 异常检测配置")
+    threshold = st.sidebar.slider(
+        "稳健Z分数阈值",
+        min_value=2.0,
+        max_value=8.0,
+        value=3.5,
+        step=0.5,
+        help="最新一场与该SKU历史中位数的偏离超过 阈值 × 1.4826 × MAD 时标记为异常",
+    )
+    min_history = st.sidebar.slider(
+        "最少历史场次", min_value=2, max_value=max(2, len(session_names) - 1), value=min(3, len(session_names) - 1)
+    )
+    top_n = st.sidebar.slider("显示数量", min_value=5, max_value=100, value=20)
+
+    anomalies = compute_anomalies(
+        data_loader.data_version, data_loader, threshold, min_history
+    )
+
+    st.subheader("🚨 异常检测")
+    st.info(
+        f"最新场次 {session_names[-1]}：检测 {len(ANOMALY_METRICS)} 个指标，"
+        f"发现 {len(anomalies)} 个异常（SKU × 指标）"
+    )
+    if anomalies.empty:
+        st.success("✅ 没有发现明显偏离历史的SKU")
+        return anomalies
+
+    col1, col2, col3 = st.columns(3)
+    for col, metric in zip([col1, col2, col3], ANOMALY_METRICS):
+        with col:
+            st.metric(metric, int((anomalies["指标"] == metric).sum()))
+
+    top_anomalies = anomalies.head(top_n)
+    fig_anomalies = px.bar(
+        top_anomalies.iloc[::-1],
+        x="稳健Z分数",
+        y=top_anomalies["SKU"].iloc[::-1] + " · " + top_anomalies["指标"].iloc[::-1],
+        color="方向",
+        orientation="h",
+        color_discrete_map={"偏高": "#00d084", "偏低": "#e60012"},
+        title=f"偏离最大的前 {len(top_anomalies)} 个异常",
+    )
+    fig_anomalies.update_layout(yaxis_title="SKU · 指标", yaxis_type="category")
+    st.plotly_chart(fig_anomalies, use_container_width=True)
+
+    display_paginated_table(anomalies, key="anomaly_table")
+    return anomalies
+
+
+@st.cache_data(max_entries=16)
+def compute_snapshot_diff(snapshot_root, old_id, new_id):
+    """对比两个快照，快照写出后不再变化，按版本号缓存"""
+    return SnapshotStore(snapshot_root).diff(old_id, new_id)
+
+
+def display_snapshot_diff(data_source):
+    """显示两个版本快照之间新增、移除和变化的SKU，以及被重新映射的标题"""
+    store = SnapshotStore.for_data_path(data_source) if data_source else None
+    snapshots = store.list_snapshots() if store is not None else []
+    if len(snapshots) < 2:
+        st.info("ℹ️ 至少需要两个版本快照才能对比；完整加载数据文件夹时会自动保存快照，数据或SKU规则变化后再次加载即可对比")
+        return None
+
+    labels = {
+        meta["id"]: f"{meta['created'].replace('T', ' ')} · {len(meta['sessions'])}场 · {meta['skus']}个SKU"
+        + (f" · {meta['label']}" if meta.get("label") else "")
+        for meta in snapshots
+    }
+    ids = list(labels)
+    st.sidebar.subheader("🗂️ 版本对比配置")
+    new_id = st.sidebar.selectbox("新版本", options=ids, format_func=labels.get)
+    old_id = st.sidebar.selectbox(
+        "旧版本",
+        options=ids,
+        index=min(ids.index(new_id) + 1, len(ids) - 1),
+        format_func=labels.get,
+    )
+    if old_id == new_id:
+        st.warning("⚠️ 请选择两个不同的版本")
+        return None
+
+    diff = compute_snapshot_diff(str(store.root), old_id, new_id)
+    counts = summarize_diff(diff)
+    old_meta = next(meta for meta in snapshots if meta["id"] == old_id)
+    new_meta = next(meta for meta in snapshots if meta["id"] == new_id)
+
+    st.subheader("🗂️ 版本对比")
+    added_sessions = [s for s in new_meta["sessions"] if s not in old_meta["sessions"]]
+    removed_sessions = [s for s in old_meta["sessions"] if s not in new_meta["sessions"]]
+    notes = []
+    if added_sessions:
+        notes.append(f"新增场次: {', '.join(added_sessions)}")
+    if removed_sessions:
+        notes.append(f"移除场次: {', '.join(removed_sessions)}")
+    if old_meta["rules_version"] != new_meta["rules_version"]:
+        notes.append("SKU规则已修改")
+    st.info(f"{labels[old_id]} → {labels[new_id]}" + (f"（{'；'.join(notes)}）" if notes else ""))
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("新增SKU", counts[STATUS_ADDED])
+    col2.metric("移除SKU", counts[STATUS_REMOVED])
+    col3.metric("指标变化SKU", counts[STATUS_CHANGED])
+    col4.metric("重新映射标题", counts["重新映射"])
+
+    skus = diff["skus"]
+    metrics = [col[: -len("(变化)")] for col in skus.columns if col.endswith("(变化)")]
+    if metrics:
+        metric = st.sidebar.selectbox("变化指标", options=metrics)
+        top_n = st.sidebar.slider("图表显示数量", min_value=5, max_value=50, value=15)
+        movers = skus.loc[skus["状态"] == STATUS_CHANGED, ["SKU", f"{metric}(变化)"]]
+        movers = movers[movers[f"{metric}(变化)"].abs() > 0]
+        movers = movers.reindex(
+            movers[f"{metric}(变化)"].abs().sort_values(ascending=False).index
+        ).head(top_n)
+        if not movers.empty:
+            fig = px.bar(
+                movers.iloc[::-1],
+                x=f"{metric}(变化)",
+                y="SKU",
+                orientation="h",
+                color=f"{metric}(变化)",
+                color_continuous_scale="RdYlGn",
+                title=f"{metric} 变化最大的SKU",
+            )
+            fig.update_layout(yaxis_type="category")
+            st.plotly_chart(fig, use_container_width=True)
+
+    statuses = st.multiselect(
+        "SKU状态",
+        options=[STATUS_ADDED, STATUS_REMOVED, STATUS_CHANGED, STATUS_UNCHANGED],
+        default=[STATUS_ADDED, STATUS_REMOVED, STATUS_CHANGED],
+    )
+    filtered = skus[skus["状态"].isin(statuses)].reset_index(drop=True)
+    display_paginated_table(filtered, key="snapshot_diff_table")
+
+    if not diff["mapping"].empty:
+        st.write("**🔀 标题映射变化**")
+        display_paginated_table(diff["mapping"], key="snapshot_mapping_table")
+    return filtered
+
+
+def display_sku_drilldown(data_loader):
+    """显示单个SKU在各场次的完整记录"""
+    skus = data_loader.sku_index.get_skus()
+    if not skus:
+        st.warning("没有可查看的SKU")
+        return None
+
+    selected_sku = st.sidebar.selectbox(
+        "选择SKU", options=skus, help="可输入货号搜索"
+    )
+    history = data_loader.get_sku_history(selected_sku)
+    if history is None or history.empty:
+        st.error(f"SKU {selected_sku} 没有数据")
+        return None
+
+    st.subheader(f"🔎 SKU {selected_sku} 明细")
+
+    # SKU概览
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("出现场次", len(history))
+    with col2:
+        if "用户支付金额" in history.columns:
+            st.metric("总支付金额", f"¥{history['用户支付金额'].sum():,.2f}")
+    with col3:
+        if "成交件数" in history.columns:
+            st.metric("总成交件数", f"{history['成交件数'].sum():,}")
+    with col4:
+        if "成交件数" in history.columns and "讲解次数" in history.columns:
+            total_explains = history["讲解次数"].sum()
+            if total_explains > 0:
+                st.metric(
+                    "讲解效率", f"{history['成交件数'].sum() / total_explains:.2f}"
+                )
+
+    # 逐场次趋势
+    metric_options = [
+        col
+        for col in [
+            "用户支付金额",
+            "成交件数",
+            "商品点击人数",
+            "讲解次数",
+            "成交件数/每次讲解",
+            "单次讲解成交金额",
+            "商品点击-成交转化率（人数）",
+            "直播间价格",
+        ]
+        if col in history.columns
+    ]
+    trend_metric = st.selectbox("趋势指标", options=metric_options)
+    fig_trend = px.line(
+        history,
+        x="场次",
+        y=trend_metric,
+        markers=True,
+        title=f"SKU {selected_sku} {trend_metric} 逐场变化",
+    )
+    st.plotly_chart(fig_trend, use_container_width=True)
+
+    st.write("**逐场次汇总**")
+    display_paginated_table(history, key="sku_history_table")
+
+    sku_rows = data_loader.get_sku_rows(selected_sku)
+    with st.expander(f"原始记录 ({len(sku_rows)} 行)"):
+        display_paginated_table(sku_rows, key="sku_rows_table")
+    return sku_rows
+
+
+def load_session_summaries(data_source, date_range, rules_version):
+    """
+    从场次摘要清单读取所选场次的摘要，不读取Excel文件
+    任一场次的摘要缺失或过期时返回 (manifest, None)
+    """
+    if os.path.isdir(data_source):
+        session_index = SessionIndex.from_directory(data_source)
+    else:
+        session_index = SessionIndex.from_paths([data_source])
+    manifest = SessionManifest.for_data_path(data_source)
+    if date_range:
+        manifest.apply_cached_dates(session_index)
+    summaries = manifest.get_fresh_entries(
+        session_index.select(date_range), rules_version
+    )
+    return manifest, summaries
+
+
+def display_single_session_analysis(selected_session, summary, load_rows):
+    """
+    显示单场数据分析
+    summary: 场次摘要，概览指标直接从摘要渲染
+    load_rows: 加载场次明细数据的函数，只在需要显示表格时调用
+    """
+    if not summary or not summary["rows"]:
         st.error(f"场次 {selected_session} 数据为空")
         return
 
@@ -379,28 +1019,77 @@ def display_single_session_analysis(data_loader, selected_session):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        st.metric("SKU数量", len(session_data))
+        st.metric("SKU数量", summary["rows"])
 
     with col2:
-        if "用户支付金额" in session_data.columns:
-            total_payment = session_data["用户支付金额"].sum()
-            st.metric("总支付金额", f"¥{total_payment:,.2f}")
+        if summary["total_payment"] is not None:
+            st.metric("总支付金额", f"¥{summary['total_payment']:,.2f}")
 
     with col3:
-        if "商品点击人数" in session_data.columns:
-            total_clicks = session_data["商品点击人数"].sum()
-            st.metric("总点击人数", f"{total_clicks:,}")
+        if summary["total_clicks"] is not None:
+            st.metric("总点击人数", f"{summary['total_clicks']:,}")
 
     with col4:
-        if "成交件数" in session_data.columns:
-            total_deals = session_data["成交件数"].sum()
-            st.metric("总成交件数", f"{total_deals:,}")
+        if summary["total_deals"] is not None:
+            st.metric("总成交件数", f"{summary['total_deals']:,}")
 
-    # 数据表格
-    st.dataframe(session_data, use_container_width=True, height=400)
+    if summary["price_min"] is not None:
+        st.caption(
+            f"直播间价格 ¥{summary['price_min']:,.2f} - ¥{summary['price_max']:,.2f}，"
+            f"不同SKU {len(summary['skus'])} 个"
+        )
 
+    # 数据表格（按需加载明细）
+    if st.toggle("显示明细数据", key="show_session_rows"):
+        session_data = load_rows()
+        if session_data is None or session_data.empty:
+            st.error(f"场次 {selected_session} 明细数据不可用")
+            return
+        display_paginated_table(session_data, key="session_table", height=400)
+
+
+def display_data_export(analysis_view, load_export_df, n_rows):
+    """
+    数据导出功能
+    load_export_df: 加载导出数据的函数，只在点击导出时调用
+    """
+    st.markdown("---")
+    st.subheader("💾 数据导出")
+
+    if not n_rows:
+        return
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        if st.button("导出当前数据为CSV"):
+            csv = load_export_df().to_csv(index=False, encoding="utf-8-sig")
+            st.download_button(
+                label="下载CSV文件",
+                data=csv,
+                file_name=f"{analysis_view}_data.csv",
+                mime="text/csv",
+            )
 
-def main():
+    with col2:
+        if st.button("导出数据统计报告"):
+            report = load_export_df().describe().to_csv(encoding="utf-8-sig")
+            st.download_button(
+                label="下载统计报告",
+                data=report,
+                file_name=f"{analysis_view}_report.csv",
+                mime="text/csv",
+            )
+
+    with col3:
+        st.info(f"当前显示 {n_rows} 条记录")
+
+
+def main(profiler=None, cached=True):
+    """
+    profiler: 记录本次运行的性能分析
+    cached: 为 False 时本次运行不使用数据加载缓存，分析包含数据加载和处理的耗时
+    """
     st.title("📊 多场直播数据分析可视化看板")
     st.markdown("---")
 
@@ -410,11 +1099,12 @@ def main():
     # 数据源选择
     data_source_type = st.sidebar.radio(
         "选择数据源类型",
-        options=["文件夹", "单个文件"],
-        help="选择文件夹可自动加载所有xlsx文件，选择单个文件适用于单场分析",
+        options=["文件夹", "单个文件", "上传文件"],
+        help="选择文件夹可自动加载所有xlsx文件，选择单个文件适用于单场分析，上传文件直接从浏览器上传xlsx文件",
     )
 
     data_source = None
+    date_range = None
     if data_source_type == "文件夹":
         # 使用文件输入选择文件夹中的文件
         data_folder = st.sidebar.text_input(
@@ -422,9 +1112,10 @@ def main():
         )
         if os.path.exists(data_folder) and os.path.isdir(data_folder):
             data_source = data_folder
+            date_range = select_date_range(data_folder)
         else:
             st.sidebar.error("文件夹路径不存在")
-    else:
+    elif data_source_type == "单个文件":
         # 单个文件选择
         data_file = st.sidebar.text_input(
             "数据文件路径", value="data/20250701_1.xlsx", help="输入excel文件路径"
@@ -434,34 +1125,155 @@ def main():
         else:
             st.sidebar.error("文件路径不存在")
 
-    if not data_source:
-        st.warning("⚠️ 请配置正确的数据源路径")
+    # 上传文件：上传模式下作为唯一数据源，其他模式下合并到已加载的数据中
+    uploaded_files = st.sidebar.file_uploader(
+        "上传Excel文件" if data_source_type == "上传文件" else "追加上传Excel文件",
+        type=["xlsx"],
+        accept_multiple_files=True,
+        help="文件在内存中解析，相同内容的文件重复上传时直接使用缓存",
+    )
+
+    if not data_source and not (data_source_type == "上传文件" and uploaded_files):
+        if data_source_type == "上传文件":
+            st.warning("⚠️ 请上传Excel文件")
+        else:
+            st.warning("⚠️ 请配置正确的数据源路径")
         return
 
-    # 加载数据
-    data_loader = load_and_process_data(
-        data_source, data_source_type.lower().replace(" ", "_")
+    st.sidebar.markdown("---")
+    st.sidebar.header("🔧 分析配置")
+
+    # 分析视图选择
+    analysis_view = st.sidebar.selectbox(
+        "选择分析视图",
+        options=["聚合分析", "场次对比", "变化榜", "异常检测", "单场分析", "SKU明细", "版本对比"],
+        help="聚合分析：按SKU汇总所有场次数据；场次对比：查看SKU在不同场次的趋势；变化榜：查看SKU相对上一场的增减和排名变化；异常检测：找出最新一场明显偏离自身历史的SKU；单场分析：分析单个场次数据；SKU明细：查看单个SKU在各场次的记录；版本对比：对比两次构建之间SKU和指标的变化",
     )
 
+    rules_version = get_default_engine().version
+    if profiler is not None:
+        profiler.annotate(view=analysis_view, data_source_type=data_source_type)
+
+    # 单场分析优先使用场次摘要清单，无需加载整个文件夹
+    if analysis_view == "单场分析" and data_source and not uploaded_files:
+        manifest, summaries = load_session_summaries(
+            data_source, date_range, rules_version
+        )
+        if summaries:
+            selected_session = st.sidebar.selectbox(
+                "选择场次", options=list(summaries)
+            )
+            if profiler is not None:
+                profiler.annotate(
+                    data_path=str(data_source),
+                    sessions=len(summaries),
+                    rows=summaries[selected_session]["rows"],
+                )
+            display_single_session_analysis(
+                selected_session,
+                summaries[selected_session],
+                lambda: manifest.read_frame(selected_session),
+            )
+            display_data_export(
+                analysis_view,
+                lambda: manifest.read_frame(selected_session),
+                summaries[selected_session]["rows"],
+            )
+            return
+
+    # 加载数据（规则文件变化时自动重新加载）
+    if uploaded_files:
+        upload_keys, upload_frames = parse_uploaded_files(uploaded_files)
+        data_loader = uncached(load_with_uploads, cached)(
+            data_source,
+            data_source_type.lower().replace(" ", "_"),
+            rules_version,
+            date_range,
+            upload_keys,
+            upload_frames,
+            _cached=cached,
+        )
+    elif SHARED_DATASET_MODE and data_source_type == "文件夹":
+        data_loader = load_shared_data(data_source, rules_version, date_range, cached)
+    else:
+        data_loader = uncached(load_and_process_data, cached)(
+            data_source,
+            data_source_type.lower().replace(" ", "_"),
+            rules_version,
+            date_range,
+        )
+
     if data_loader is None:
         st.error("❌ 数据加载失败，请检查数据文件是否存在")
         return
+    if profiler is not None:
+        profiler.annotate(**describe_dataset(data_loader))
 
     # 获取场次信息
     session_names = data_loader.get_session_names()
     if not session_names:
-        st.error("❌ 没有找到有效的场次数据")
+        if date_range:
+            st.error(f"❌ {date_range[0]} 至 {date_range[1]} 之间没有场次数据")
+        else:
+            st.error("❌ 没有找到有效的场次数据")
         return
 
-    st.sidebar.markdown("---")
-    st.sidebar.header("🔧 分析配置")
+    # 导入报告：重复文件和疑似重复文件
+    ingestion_df = data_loader.ingestion_report.to_dataframe()
+    n_skipped = len(data_loader.ingestion_report.skipped)
+    n_near = len(data_loader.ingestion_report.near_duplicates)
+    n_undated = len(data_loader.ingestion_report.undated)
+    with st.sidebar.expander(
+        f"📥 导入报告 (跳过 {n_skipped}，疑似重复 {n_near}，未识别日期 {n_undated})",
+        expanded=bool(n_skipped or n_near or n_undated),
+    ):
+        if n_undated:
+            st.warning(
+                f"{n_undated} 个文件名中没有日期的文件未按日期范围读取。"
+                "选择“全部场次”加载一次后，会按首次上架时间识别这些文件的日期"
+            )
+            st.caption("、".join(Path(path).name for path in data_loader.ingestion_report.undated))
+        if n_skipped:
+            st.warning(f"{n_skipped} 个文件与已加载文件完全相同，已跳过")
+        if n_near:
+            st.warning(f"{n_near} 个文件的数据行与其他场次完全相同，请确认是否重复导入")
+        st.dataframe(ingestion_df, use_container_width=True, hide_index=True)
+
+    if SHARED_DATASET_MODE:
+        memory = get_memory_usage()
+        if memory is not None:
+            st.sidebar.caption(
+                f"共享数据集模式 · 进程内存 RSS {memory['RSS']} MB / "
+                f"PSS {memory['PSS']} MB / 独占 USS {memory['USS']} MB"
+            )
 
-    # 分析视图选择
-    analysis_view = st.sidebar.selectbox(
-        "选择分析视图",
-        options=["聚合分析", "场次对比", "单场分析"],
-        help="聚合分析：按SKU汇总所有场次数据；场次对比：查看SKU在不同场次的趋势；单场分析：分析单个场次数据",
-    )
+    # SKU规则命中统计
+    with st.sidebar.expander("🧩 SKU规则统计"):
+        if data_loader.rule_stats is None:
+            st.caption("共享数据集直接使用已提取的SKU，本次没有执行规则匹配")
+        else:
+            st.dataframe(
+                data_loader.rule_stats, use_container_width=True, hide_index=True
+            )
+
+    # 未匹配SKU的标题
+    unmatched_df = data_loader.unmatched_report.to_dataframe()
+    with st.sidebar.expander(f"⚠️ 未匹配标题 ({len(unmatched_df)})"):
+        if unmatched_df.empty:
+            st.success("所有标题均已匹配SKU")
+        else:
+            if "建议SKU" in unmatched_df.columns:
+                st.caption("建议SKU 来自字符相似度最高的已知标题，请核对后在规则中补充")
+            st.dataframe(unmatched_df, use_container_width=True, hide_index=True)
+
+    # 按相似标题自动匹配的SKU
+    auto_assigned_df = data_loader.get_auto_assigned()
+    if not auto_assigned_df.empty:
+        with st.sidebar.expander(f"🔗 相似标题自动匹配 ({len(auto_assigned_df)})"):
+            st.caption(
+                f"相似度不低于 {get_default_engine().auto_assign_threshold} 时自动采用最相似标题的SKU"
+            )
+            st.dataframe(auto_assigned_df, use_container_width=True, hide_index=True)
 
     # 根据分析视图显示相应配置
     if analysis_view == "单场分析":
@@ -469,14 +1281,43 @@ def main():
 
     # 主要内容区域
     if analysis_view == "聚合分析":
+        # 时间粒度：全部场次汇总，或按日/周/月的物化汇总表
+        granularity = st.sidebar.selectbox(
+            "时间粒度",
+            options=["全部"] + GRANULARITIES,
+            help="全部：汇总所有场次；日/周/月：查看某个周期内的SKU汇总",
+        )
+
         # 显示聚合数据分析
         df = data_loader.aggregated_df
+        aggregated_sessions = session_names
+        # 决定图表数据的参数，表格排序不影响图表
+        figure_params = [data_loader.data_version, granularity]
+        if granularity != "全部":
+            periods = data_loader.rollups.get_periods(granularity)
+            if not periods:
+                st.error("❌ 没有可识别日期的场次，无法按时间汇总")
+                return
+            selected_period = st.sidebar.selectbox(
+                "选择周期", options=periods, index=len(periods) - 1
+            )
+            df = data_loader.rollups.get_rollup(granularity, selected_period)
+            figure_params.append(selected_period)
+            aggregated_sessions = data_loader.rollups.get_period_sessions(
+                granularity, selected_period
+            )
+
         if df is None or df.empty:
             st.error("❌ 聚合数据为空")
             return
 
         st.subheader("📊 SKU聚合数据分析")
-        st.info(f"已聚合 {len(session_names)} 场数据，共 {len(df)} 个SKU")
+        if granularity == "全部":
+            st.info(f"已聚合 {len(aggregated_sessions)} 场数据，共 {len(df)} 个SKU")
+        else:
+            st.info(
+                f"{selected_period} 共 {len(aggregated_sessions)} 场数据，共 {len(df)} 个SKU"
+            )
 
         # 侧边栏筛选配置
         st.sidebar.subheader("数据筛选")
@@ -490,6 +1331,7 @@ def main():
             )
             if selected_skus:
                 df = df[df["SKU"].isin(selected_skus)]
+                figure_params.append(tuple(selected_skus))
 
         # 价格范围筛选
         if "直播间价格" in df.columns:
@@ -507,6 +1349,7 @@ def main():
                     (df["直播间价格"] >= price_range[0])
                     & (df["直播间价格"] <= price_range[1])
                 ]
+                figure_params.append(tuple(price_range))
 
         # 排序选项
         st.sidebar.subheader("排序选项")
@@ -546,12 +1389,12 @@ def main():
 
         with col1:
             st.subheader("📋 聚合数据表格")
-            st.dataframe(df, use_container_width=True, height=650)
+            display_paginated_table(df, key="aggregated_table", height=650)
 
         with col2:
             st.subheader("📈 数据概览")
             st.metric("SKU数量", len(df))
-            st.metric("场次数量", len(session_names))
+            st.metric("场次数量", len(aggregated_sessions))
 
             if "用户支付金额" in df.columns:
                 total_payment = df["用户支付金额"].sum()
@@ -575,6 +1418,13 @@ def main():
         st.markdown("---")
         st.subheader("📊 数据可视化")
 
+        # 参数未变化时复用已生成的图表，只重新生成参数变化的图表
+        figure_cache = get_figure_cache()
+        figure_params = tuple(figure_params)
+
+        def cached_figure(kind, build):
+            return figure_cache.get_or_build((figure_params, kind), build)
+
         # 创建选项卡
         tab1, tab2, tab3 = st.tabs(["💰 价格分析", "👥 用户行为", "🎯 转化分析"])
 
@@ -584,27 +1434,39 @@ def main():
 
                 with col1:
                     # 价格分布直方图
-                    fig_price_dist = px.histogram(
-                        df, x="直播间价格", title="直播间价格分布", nbins=20
-                    )
-                    fig_price_dist.update_layout(
-                        xaxis_title="价格 (¥)", yaxis_title="频次"
+                    def build_price_dist():
+                        fig_price_dist = px.histogram(
+                            df, x="直播间价格", title="直播间价格分布", nbins=20
+                        )
+                        fig_price_dist.update_layout(
+                            xaxis_title="价格 (¥)", yaxis_title="频次"
+                        )
+                        return fig_price_dist
+
+                    st.plotly_chart(
+                        cached_figure("价格分布", build_price_dist),
+                        use_container_width=True,
                     )
-                    st.plotly_chart(fig_price_dist, use_container_width=True)
 
                 with col2:
                     # 价格对比散点图
-                    fig_price_compare = px.scatter(
-                        df,
-                        x="直播间价格",
-                        y="用户支付金额",
-                        title="直播间价格 vs 用户支付金额",
-                        hover_data=["SKU"] if "SKU" in df.columns else None,
-                    )
-                    fig_price_compare.update_layout(
-                        xaxis_title="直播间价格 (¥)", yaxis_title="用户支付金额 (¥)"
+                    def build_price_compare():
+                        fig_price_compare = px.scatter(
+                            df,
+                            x="直播间价格",
+                            y="用户支付金额",
+                            title="直播间价格 vs 用户支付金额",
+                            hover_data=["SKU"] if "SKU" in df.columns else None,
+                        )
+                        fig_price_compare.update_layout(
+                            xaxis_title="直播间价格 (¥)", yaxis_title="用户支付金额 (¥)"
+                        )
+                        return fig_price_compare
+
+                    st.plotly_chart(
+                        cached_figure("价格对比", build_price_compare),
+                        use_container_width=True,
                     )
-                    st.plotly_chart(fig_price_compare, use_container_width=True)
 
         with tab2:
             if "商品点击人数" in df.columns:
@@ -620,24 +1482,30 @@ def main():
                         horizontal=True,
                     )
 
-                    # 按点击人数排序数据
-                    clicks_ascending = clicks_sort_order == "按点击数升序"
-                    df_sorted_clicks = df.sort_values(
-                        by="商品点击人数", ascending=clicks_ascending
-                    )
+                    def build_clicks():
+                        # 按点击人数排序数据
+                        clicks_ascending = clicks_sort_order == "按点击数升序"
+                        df_sorted_clicks = df.sort_values(
+                            by="商品点击人数", ascending=clicks_ascending
+                        )
 
-                    # 点击人数分布（按排序显示）
-                    fig_clicks = px.bar(
-                        df_sorted_clicks,
-                        x="SKU",
-                        y="商品点击人数",
-                        title=f"商品点击人数 ({clicks_sort_order})",
-                        hover_data=["SKU"],
-                    )
-                    fig_clicks.update_layout(
-                        xaxis_title="SKU", yaxis_title="点击人数", xaxis_tickangle=-45
+                        # 点击人数分布（按排序显示）
+                        fig_clicks = px.bar(
+                            df_sorted_clicks,
+                            x="SKU",
+                            y="商品点击人数",
+                            title=f"商品点击人数 ({clicks_sort_order})",
+                            hover_data=["SKU"],
+                        )
+                        fig_clicks.update_layout(
+                            xaxis_title="SKU", yaxis_title="点击人数", xaxis_tickangle=-45
+                        )
+                        return fig_clicks
+
+                    st.plotly_chart(
+                        cached_figure(("点击人数", clicks_sort_order), build_clicks),
+                        use_container_width=True,
                     )
-                    st.plotly_chart(fig_clicks, use_container_width=True)
 
                 with col2:
                     if "成交件数/每次讲解" in df.columns:
@@ -650,26 +1518,34 @@ def main():
                             horizontal=True,
                         )
 
-                        # 按讲解效率排序数据
-                        efficiency_ascending = efficiency_sort_order == "按效率升序"
-                        df_sorted_efficiency = df.sort_values(
-                            by="成交件数/每次讲解", ascending=efficiency_ascending
-                        )
+                        def build_efficiency():
+                            # 按讲解效率排序数据
+                            efficiency_ascending = efficiency_sort_order == "按效率升序"
+                            df_sorted_efficiency = df.sort_values(
+                                by="成交件数/每次讲解", ascending=efficiency_ascending
+                            )
 
-                        # 讲解效率条形图
-                        fig_efficiency = px.bar(
-                            df_sorted_efficiency,
-                            x="SKU",
-                            y="成交件数/每次讲解",
-                            title=f"每次讲解成交件数 ({efficiency_sort_order})",
-                            hover_data=["SKU"],
-                        )
-                        fig_efficiency.update_layout(
-                            xaxis_title="SKU",
-                            yaxis_title="成交件数/每次讲解",
-                            xaxis_tickangle=-45,
+                            # 讲解效率条形图
+                            fig_efficiency = px.bar(
+                                df_sorted_efficiency,
+                                x="SKU",
+                                y="成交件数/每次讲解",
+                                title=f"每次讲解成交件数 ({efficiency_sort_order})",
+                                hover_data=["SKU"],
+                            )
+                            fig_efficiency.update_layout(
+                                xaxis_title="SKU",
+                                yaxis_title="成交件数/每次讲解",
+                                xaxis_tickangle=-45,
+                            )
+                            return fig_efficiency
+
+                        st.plotly_chart(
+                            cached_figure(
+                                ("讲解效率", efficiency_sort_order), build_efficiency
+                            ),
+                            use_container_width=True,
                         )
-                        st.plotly_chart(fig_efficiency, use_container_width=True)
 
         with tab3:
             col1, col2 = st.columns(2)
@@ -677,32 +1553,42 @@ def main():
             if "商品点击-成交转化率（人数）" in df.columns:
                 with col1:
                     # 转化率分布
-                    fig_conversion = px.histogram(
-                        df,
-                        x="商品点击-成交转化率（人数）",
-                        title="转化率分布",
-                        nbins=20,
-                    )
-                    fig_conversion.update_layout(
-                        xaxis_title="转化率 (%)", yaxis_title="频次"
+                    def build_conversion():
+                        fig_conversion = px.histogram(
+                            df,
+                            x="商品点击-成交转化率（人数）",
+                            title="转化率分布",
+                            nbins=20,
+                        )
+                        fig_conversion.update_layout(
+                            xaxis_title="转化率 (%)", yaxis_title="频次"
+                        )
+                        return fig_conversion
+
+                    st.plotly_chart(
+                        cached_figure("转化率分布", build_conversion),
+                        use_container_width=True,
                     )
-                    st.plotly_chart(fig_conversion, use_container_width=True)
 
                 with col2:
                     # 转化率 vs 用户支付金额
                     if "用户支付金额" in df.columns:
-                        fig_conversion_payment = px.scatter(
-                            df,
-                            x="商品点击-成交转化率（人数）",
-                            y="用户支付金额",
-                            title="转化率 vs 用户支付金额",
-                            hover_data=["SKU"] if "SKU" in df.columns else None,
-                        )
-                        fig_conversion_payment.update_layout(
-                            xaxis_title="转化率 (%)", yaxis_title="用户支付金额 (¥)"
-                        )
+                        def build_conversion_payment():
+                            fig_conversion_payment = px.scatter(
+                                df,
+                                x="商品点击-成交转化率（人数）",
+                                y="用户支付金额",
+                                title="转化率 vs 用户支付金额",
+                                hover_data=["SKU"] if "SKU" in df.columns else None,
+                            )
+                            fig_conversion_payment.update_layout(
+                                xaxis_title="转化率 (%)", yaxis_title="用户支付金额 (¥)"
+                            )
+                            return fig_conversion_payment
+
                         st.plotly_chart(
-                            fig_conversion_payment, use_container_width=True
+                            cached_figure("转化率对比", build_conversion_payment),
+                            use_container_width=True,
                         )
 
             # 讲解效率分析
@@ -712,94 +1598,156 @@ def main():
 
                 with col3:
                     # 讲解效率分布
-                    fig_efficiency_dist = px.histogram(
-                        df, x="成交件数/每次讲解", title="讲解效率分布", nbins=20
-                    )
-                    fig_efficiency_dist.update_layout(
-                        xaxis_title="成交件数/每次讲解", yaxis_title="频次"
+                    def build_efficiency_dist():
+                        fig_efficiency_dist = px.histogram(
+                            df, x="成交件数/每次讲解", title="讲解效率分布", nbins=20
+                        )
+                        fig_efficiency_dist.update_layout(
+                            xaxis_title="成交件数/每次讲解", yaxis_title="频次"
+                        )
+                        return fig_efficiency_dist
+
+                    st.plotly_chart(
+                        cached_figure("讲解效率分布", build_efficiency_dist),
+                        use_container_width=True,
                     )
-                    st.plotly_chart(fig_efficiency_dist, use_container_width=True)
 
                 with col4:
                     # 讲解效率 vs 转化率（如果转化率存在）
                     if "商品点击-成交转化率（人数）" in df.columns:
-                        fig_efficiency_conversion = px.scatter(
-                            df,
-                            x="成交件数/每次讲解",
-                            y="商品点击-成交转化率（人数）",
-                            title="讲解效率 vs 转化率",
-                            hover_data=["SKU"] if "SKU" in df.columns else None,
-                        )
-                        fig_efficiency_conversion.update_layout(
-                            xaxis_title="成交件数/每次讲解", yaxis_title="转化率 (%)"
-                        )
+                        def build_efficiency_conversion():
+                            fig_efficiency_conversion = px.scatter(
+                                df,
+                                x="成交件数/每次讲解",
+                                y="商品点击-成交转化率（人数）",
+                                title="讲解效率 vs 转化率",
+                                hover_data=["SKU"] if "SKU" in df.columns else None,
+                            )
+                            fig_efficiency_conversion.update_layout(
+                                xaxis_title="成交件数/每次讲解", yaxis_title="转化率 (%)"
+                            )
+                            return fig_efficiency_conversion
+
                         st.plotly_chart(
-                            fig_efficiency_conversion, use_container_width=True
+                            cached_figure("讲解效率对比转化率", build_efficiency_conversion),
+                            use_container_width=True,
                         )
                     elif "用户支付金额" in df.columns:
                         # 讲解效率 vs 支付金额
-                        fig_efficiency_payment = px.scatter(
-                            df,
-                            x="成交件数/每次讲解",
-                            y="用户支付金额",
-                            title="讲解效率 vs 用户支付金额",
-                            hover_data=["SKU"] if "SKU" in df.columns else None,
-                        )
-                        fig_efficiency_payment.update_layout(
-                            xaxis_title="成交件数/每次讲解",
-                            yaxis_title="用户支付金额 (¥)",
-                        )
+                        def build_efficiency_payment():
+                            fig_efficiency_payment = px.scatter(
+                                df,
+                                x="成交件数/每次讲解",
+                                y="用户支付金额",
+                                title="讲解效率 vs 用户支付金额",
+                                hover_data=["SKU"] if "SKU" in df.columns else None,
+                            )
+                            fig_efficiency_payment.update_layout(
+                                xaxis_title="成交件数/每次讲解",
+                                yaxis_title="用户支付金额 (¥)",
+                            )
+                            return fig_efficiency_payment
+
                         st.plotly_chart(
-                            fig_efficiency_payment, use_container_width=True
+                            cached_figure("讲解效率对比支付金额", build_efficiency_payment),
+                            use_container_width=True,
                         )
 
     elif analysis_view == "场次对比":
         # 显示场次对比分析
         display_session_comparison(data_loader)
 
+    elif analysis_view == "变化榜":
+        # 显示场次环比变化榜
+        delta_board = display_delta_leaderboard(data_loader)
+
+    elif analysis_view == "异常检测":
+        # 显示异常SKU
+        anomalies = display_anomalies(data_loader)
+
     elif analysis_view == "单场分析":
         # 显示单场数据分析
-        display_single_session_analysis(data_loader, selected_session)
+        display_single_session_analysis(
+            selected_session,
+            data_loader.get_session_summary(selected_session),
+            lambda: data_loader.get_session_data(selected_session),
+        )
 
-    # 数据导出功能
-    st.markdown("---")
-    st.subheader("💾 数据导出")
+    elif analysis_view == "SKU明细":
+        # 显示单个SKU的跨场次明细
+        sku_rows = display_sku_drilldown(data_loader)
 
-    col1, col2, col3 = st.columns(3)
+    elif analysis_view == "版本对比":
+        # 显示两个版本快照之间的差异
+        snapshot_diff = display_snapshot_diff(
+            data_source if data_source_type == "文件夹" else None
+        )
 
-    # 根据当前视图确定要导出的数据
+    # 数据导出功能
     export_df = None
     if analysis_view == "聚合分析":
         export_df = data_loader.aggregated_df
     elif analysis_view == "单场分析":
         export_df = data_loader.get_session_data(selected_session)
+    elif analysis_view == "SKU明细":
+        export_df = sku_rows
+    elif analysis_view == "变化榜":
+        export_df = delta_board
+    elif analysis_view == "异常检测":
+        export_df = anomalies
+    elif analysis_view == "版本对比":
+        export_df = snapshot_diff
     else:
-        export_df = data_loader.df
+        # 未合并完整数据时，只在导出时合并各场次
+        display_data_export(
+            analysis_view,
+            data_loader.get_combined_data,
+            sum(len(df) for df in data_loader.session_data.values()),
+        )
+        return
 
-    if export_df is not None and not export_df.empty:
-        with col1:
-            if st.button("导出当前数据为CSV"):
-                csv = export_df.to_csv(index=False, encoding="utf-8-sig")
-                st.download_button(
-                    label="下载CSV文件",
-                    data=csv,
-                    file_name=f"{analysis_view}_data.csv",
-                    mime="text/csv",
-                )
+    display_data_export(
+        analysis_view,
+        lambda: export_df,
+        len(export_df) if export_df is not None else 0,
+    )
+
+
+def display_profiling_controls():
+    """侧边栏的性能分析入口：分析一次完整的页面运行"""
+    with st.sidebar.expander("⏱️ 性能分析"):
+        st.caption("记录一次完整的页面运行，分析文件保存在 logs/ 目录，可用于离线排查慢的操作")
+        cold = st.checkbox(
+            "不使用缓存分析",
+            key="profile_cold",
+            help="包含数据加载和处理的耗时；只有这一次运行绕过数据加载缓存，不影响其他用户共享的缓存",
+        )
+        if st.button("分析一次运行", key="profile_button"):
+            st.session_state[PROFILE_STATE_KEY] = "cold" if cold else "warm"
+            st.rerun()
 
-        with col2:
-            if st.button("导出数据统计报告"):
-                report = export_df.describe().to_csv(encoding="utf-8-sig")
-                st.download_button(
-                    label="下载统计报告",
-                    data=report,
-                    file_name=f"{analysis_view}_report.csv",
-                    mime="text/csv",
-                )
 
-        with col3:
-            st.info(f"当前显示 {len(export_df)} 条记录")
+def run_app():
+    """运行看板；开启性能分析模式或侧边栏请求时，记录这次运行的性能分析"""
+    requested = st.session_state.pop(PROFILE_STATE_KEY, None)
+    if not (PROFILE_RERUN_MODE or requested):
+        main()
+        display_profiling_controls()
+        return
+
+    profiler = RerunProfiler()
+    profiler.annotate(cache="cold" if requested == "cold" else "warm")
+    with profiler:
+        main(profiler, cached=requested != "cold")
+
+    display_profiling_controls()
+    if profiler.paths:
+        st.sidebar.success(
+            f"已保存性能分析（{profiler.info['elapsed_s']} 秒）: {profiler.paths['prof']}"
+        )
+        with st.sidebar.expander("⏱️ 耗时最多的函数"):
+            st.code(profiler.top_functions(), language=None)
 
 
 if __name__ == "__main__":
-    main()
+    run_app()
@@ -0,0 +1,97 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# 需要检测异常的指标
+ANOMALY_METRICS = ["商品点击-成交转化率（人数）", "单次讲解成交金额", "成交件数/每次讲解"]
+
+# MAD 换算为标准差的系数（正态分布下）
+MAD_SCALE = 1.4826
+# MAD 为0时改用平均绝对偏差，对应的换算系数
+MEAN_AD_SCALE = 1.2533
+
+
+def robust_zscores(matrix, min_history=3):
+    """
+    计算每个SKU最新一场相对自身历史的稳健Z分数，matrix 为 SKU × 场次（按时间顺序），
+    SKU未出现的场次为NaN。对整个矩阵按行向量化计算，返回包含中间结果的DataFrame
+    """
+    values = matrix.to_numpy(dtype=float, copy=True)
+    # 讲解次数为0时比率为无穷大，视为缺失
+    values[~np.isfinite(values)] = np.nan
+    latest = values[:, -1]
+    n_skus = values.shape[0]
+
+    # 只有最新一场出现的SKU才可能异常，其余行不参与中位数计算
+    present = ~np.isnan(latest)
+    history = values[present, :-1]
+
+    with warnings.catch_warnings():
+        # 没有历史数据的SKU整行为NaN，忽略对应的警告
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        median_present = np.nanmedian(history, axis=1)
+        deviation = np.abs(history - median_present[:, None])
+        mad_present = np.nanmedian(deviation, axis=1)
+        mean_ad = np.nanmean(deviation, axis=1)
+
+    count_present = np.sum(~np.isnan(history), axis=1)
+    scale = np.where(mad_present > 0, MAD_SCALE * mad_present, MEAN_AD_SCALE * mean_ad)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscore_present = np.where(
+            scale > 0, (latest[present] - median_present) / scale, np.nan
+        )
+    zscore_present[count_present < min_history] = np.nan
+
+    median = np.full(n_skus, np.nan)
+    mad = np.full(n_skus, np.nan)
+    zscore = np.full(n_skus, np.nan)
+    history_count = np.zeros(n_skus, dtype=int)
+    median[present] = median_present
+    mad[present] = mad_present
+    zscore[present] = zscore_present
+    history_count[present] = count_present
+
+    return pd.DataFrame(
+        {
+            "最新值": latest,
+            "历史中位数": median,
+            "MAD": mad,
+            "历史场次数": history_count,
+            "稳健Z分数": zscore,
+        },
+        index=matrix.index,
+    )
+
+
+def detect_anomalies(matrices, threshold=3.5, min_history=3):
+    """
+    检测最新一场明显偏离自身历史的SKU
+    matrices: {指标: SKU × 场次 矩阵}
+    返回按偏离程度降序排列的异常列表
+    """
+    results = []
+    for metric, matrix in matrices.items():
+        if matrix is None or matrix.shape[1] < 2:
+            continue
+        scores = robust_zscores(matrix, min_history)
+        flagged = scores[scores["稳健Z分数"].abs() >= threshold]
+        if flagged.empty:
+            continue
+        flagged = flagged.assign(指标=metric)
+        results.append(flagged)
+
+    columns = ["SKU", "指标", "最新值", "历史中位数", "MAD", "历史场次数", "稳健Z分数", "方向"]
+    if not results:
+        return pd.DataFrame(columns=columns)
+
+    anomalies = pd.concat(results)
+    anomalies.index.name = "SKU"
+    anomalies = anomalies.reset_index()
+    anomalies["方向"] = np.where(anomalies["稳健Z分数"] > 0, "偏高", "偏低")
+    anomalies = anomalies.reindex(
+        anomalies["稳健Z分数"].abs().sort_values(ascending=False).index
+    )
+    return anomalies[columns].round(
+        {"最新值": 2, "历史中位数": 2, "MAD": 2, "稳健Z分数": 2}
+    ).reset_index(drop=True)
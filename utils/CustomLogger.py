@@ -1,4 +1,5 @@
 from loguru import logger
 
 # 添加文件处理器，但不要重新赋值给logger
-logger.add("logs/app.log", rotation="100 MB", retention="10 days")
+# enqueue=True: 日志先进入队列，由后台线程写文件，不阻塞数据处理
+logger.add("logs/app.log", rotation="100 MB", retention="10 days", enqueue=True)
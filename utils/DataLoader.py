@@ -1,21 +1,130 @@
 import pandas as pd
-import re
+import numpy as np
+import io
 import os
+import hashlib
+from datetime import date
 from pathlib import Path
 from utils import logger
+from utils.SkuRuleEngine import get_default_engine, merge_rule_stats
+from utils.UnmatchedReport import UnmatchedTitleReport
+from utils.SessionIndex import SessionIndex, date_from_listing_time
+from utils.SkuAggregator import build_agg_dict, add_derived_metrics, aggregate_partitioned
+from utils.RollupStore import RollupStore
+from utils.SessionManifest import SessionManifest, summarize_session
+from utils.SkuIndex import SkuIndex
+from utils.IngestionReport import IngestionReport
+from utils.SharedDataset import get_shared_dir, read_shared_dataset, write_shared_dataset
+from utils.TitleIndex import INDEX_FILE_NAME, TitleNgramIndex
+from utils.WorkbookReader import (
+    is_session_sheet,
+    list_sheet_names,
+    read_workbook_sheets,
+    sheet_signature,
+    single_data_sheet,
+)
+
+
+def read_workbook_bytes(content):
+    """直接在内存中解析Excel文件内容，不写临时文件"""
+    return pd.read_excel(io.BytesIO(content))
+
+
+def hash_rows(df):
+    """与行顺序无关的数据行哈希，用于发现文件不同但内容相同的场次"""
+    row_hashes = np.sort(pd.util.hash_pandas_object(df, index=False).to_numpy())
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
 
 
 class DataLoader:
-    def __init__(self, data_path):
+    def __init__(self, data_path, rule_engine=None, date_range=None, use_cache=True):
         """
         初始化数据加载器
         data_path: 可以是单个文件路径、文件列表或包含excel文件的文件夹路径
+        rule_engine: SKU规则引擎，默认使用 config/sku_rules.json 中的规则
+        date_range: (开始日期, 结束日期)，只加载该范围内的场次，None表示全部加载
+        use_cache: 是否在数据文件夹的 .cache 下写入场次摘要和清理后的数据
         """
         self.data_path = data_path
+        self.date_range = date_range
+        self.session_index = SessionIndex()  # 已加载场次的日期索引
+        self.rule_engine = rule_engine or get_default_engine()
+        self.unmatched_report = UnmatchedTitleReport()  # 未匹配SKU的标题汇总
+        self.sku_mapping = {}  # 商品名称 -> SKU（未匹配为None），用于版本快照对比
+        self.auto_assigned = {}  # 按相似标题自动采用SKU的标题 -> (SKU, 相似标题, 相似度)
+        self.rule_stats = None  # 本数据集提取SKU时各规则的命中统计
         self.session_data = {}  # 存储每场的数据
+        self.session_signatures = {}  # 场次 -> 文件内容哈希，用于去重和计算数据版本
+        self._content_hashes = {}  # 文件内容哈希 -> 场次
+        self._row_hashes = {}  # 数据行哈希 -> 场次
+        self.ingestion_report = IngestionReport()  # 导入报告
         self.df = None  # 合并后的数据
         self.aggregated_df = None  # 聚合后的数据
+        self.rollups = RollupStore()  # 按日/周/月的SKU汇总
+        self.sku_index = SkuIndex()  # SKU -> 各场次行位置
+        self.session_manifest = (
+            SessionManifest.for_data_path(data_path)
+            if use_cache and data_path is not None
+            else None
+        )
+        # 已知SKU标题的 n-gram 索引，保存在缓存目录中，随场次加入增量更新
+        self.title_index = (
+            TitleNgramIndex.load(self.session_manifest.cache_dir / INDEX_FILE_NAME)
+            if self.session_manifest is not None
+            else TitleNgramIndex()
+        )
         self._load_data()
+        self._sort_sessions()
+
+    @classmethod
+    def from_shared_dataset(cls, directory, rule_engine=None):
+        """
+        从内存映射的共享数据集创建数据加载器，多个进程打开同一数据集时共用同一份页面缓存
+        各场次数据是合并数据的切片，不复制数值列
+        """
+        dataset = read_shared_dataset(directory)
+        if dataset is None:
+            raise FileNotFoundError(f"共享数据集不存在: {directory}")
+        df, aggregated_df, metadata = dataset
+
+        loader = cls(None, rule_engine=rule_engine, use_cache=False)
+        loader.date_range = tuple(
+            date.fromisoformat(d) if d else None for d in metadata["date_range"]
+        )
+        if loader.date_range == (None, None):
+            loader.date_range = None
+        for session in metadata["sessions"]:
+            name = session["name"]
+            session_df = df.iloc[session["start"] : session["stop"]].reset_index(drop=True)
+            loader.session_data[name] = session_df
+            loader.session_signatures[name] = session["signature"]
+            loader._content_hashes[session["signature"]] = name
+            loader.ingestion_report.add_loaded(name, session["path"] or "上传")
+            session_date = date.fromisoformat(session["date"]) if session["date"] else None
+            loader.session_index.add(
+                name,
+                path=session["path"],
+                session_date=session_date,
+                sheet=session.get("sheet"),
+            )
+            loader._index_session(name, session_df)
+        for name, skipped in metadata.get("skipped", {}).items():
+            loader.ingestion_report.add_skipped(name, skipped["path"], skipped["duplicate_of"])
+        for path in metadata.get("undated", []):
+            loader.ingestion_report.add_undated(path)
+        loader.df = df
+        loader.aggregated_df = aggregated_df
+        if aggregated_df is None:
+            loader.aggregate_by_sku()
+        logger.info(f"已打开共享数据集: {directory}，共 {len(loader.session_data)} 场 {len(df)} 行")
+        return loader
+
+    def export_shared_dataset(self, directory=None):
+        """将清理后的数据和聚合结果写成可内存映射的共享数据集，默认写到数据文件夹的 .cache/shared"""
+        directory = directory or get_shared_dir(self.data_path, self.date_range)
+        if directory is None:
+            raise ValueError("没有数据文件夹，需要指定共享数据集目录")
+        return write_shared_dataset(self, directory)
 
     def _load_data(self):
         """根据输入类型加载数据"""
@@ -31,6 +140,9 @@ class DataLoader:
         elif isinstance(self.data_path, list):
             # 文件列表
             self._load_from_file_list(self.data_path)
+        elif self.data_path is None:
+            # 空数据集，之后通过 add_uploaded_sessions 加入上传的场次
+            pass
         else:
             raise ValueError("data_path必须是文件路径、文件列表或文件夹路径")
 
@@ -40,12 +152,12 @@ class DataLoader:
         if not xlsx_files:
             raise FileNotFoundError(f"文件夹 {directory_path} 中没有找到xlsx文件")
 
-        for file_path in xlsx_files:
-            session_name = file_path.stem  # 使用文件名（不含扩展名）作为场次名
-            self._load_session_file(str(file_path), session_name)
+        # 使用文件名（不含扩展名）作为场次名
+        self._load_indexed_files(SessionIndex.from_paths(xlsx_files))
 
     def _load_from_file_list(self, file_list):
         """从文件列表加载数据"""
+        files = []
         for i, file_path in enumerate(file_list):
             if not os.path.isfile(file_path):
                 logger.error(f"警告：文件不存在，跳过: {file_path}")
@@ -55,71 +167,314 @@ class DataLoader:
                 # 如果文件名包含日期等信息，可以提取作为场次名
                 file_name = Path(file_path).stem
                 session_name = file_name
-            self._load_session_file(file_path, session_name)
+            files.append((session_name, file_path))
+        index = SessionIndex()
+        index.add_files(files)
+        self._load_indexed_files(index)
 
     def _load_single_file(self, file_path):
         """加载单个文件"""
-        session_name = Path(file_path).stem
-        self._load_session_file(file_path, session_name)
+        self._load_indexed_files(SessionIndex.from_paths([file_path]))
 
-    def _load_session_file(self, file_path, session_name):
-        """加载单个场次的文件"""
+    def _load_indexed_files(self, index):
+        """
+        只加载日期范围内的场次，范围外的文件和工作表不会被读取
+        文件名中没有日期的场次使用上次加载时记录的日期，仍无法确定日期的记入导入报告
+        多工作表文件按工作表建立索引，只解析日期范围内的工作表
+        """
+        if self.date_range and self.session_manifest is not None:
+            self.session_manifest.apply_cached_dates(index)
+        selected = index.select(self.date_range)
+        skipped = len(index) - len(selected)
+        if skipped:
+            logger.info(f"跳过日期范围 {self.date_range} 之外或无法识别日期的 {skipped} 个场次")
+        if self.date_range:
+            undated = [info.path for info in index.sessions.values() if info.date is None]
+            for path in dict.fromkeys(undated):
+                self.ingestion_report.add_undated(path)
+        files = {}
+        for info in selected:
+            files.setdefault(info.path, []).append(info)
+        for path, infos in files.items():
+            if infos[0].sheet is None:
+                self._load_session_file(path, infos[0].name)
+            else:
+                self._load_session_file(path, Path(path).stem, infos)
+
+    def _load_session_file(self, file_path, session_name, sheets=None):
+        """
+        加载单个场次的文件，内容与已加载文件完全相同时跳过，不再解析
+        包含多个工作表的文件，每个工作表作为一个场次
+        sheets: 索引中该文件要加载的工作表 [SessionInfo]，None 表示按日期范围筛选全部工作表
+        """
         try:
-            df = pd.read_excel(file_path)
-            df["场次"] = session_name
-            self.session_data[session_name] = df
-            logger.info(f"已加载场次: {session_name}, 数据条数: {len(df)}")
+            with open(file_path, "rb") as f:
+                content = f.read()
+            content_hash = hashlib.sha256(content).hexdigest()
+            duplicate_of = self._content_hashes.get(content_hash)
+            if duplicate_of is not None:
+                logger.warning(f"文件与场次 {duplicate_of} 完全相同，已跳过: {file_path}")
+                self.ingestion_report.add_skipped(session_name, file_path, duplicate_of)
+                if self.session_manifest is not None:
+                    self.session_manifest.mark_duplicate(
+                        session_name, file_path, duplicate_of, self.rule_engine.version
+                    )
+                return
+            sheet_names = list_sheet_names(content)
+            if len(sheet_names) > 1:
+                self._load_workbook_sheets(
+                    file_path, session_name, content, content_hash, sheet_names, sheets
+                )
+                return
+            df = read_workbook_bytes(content)
+            self._add_raw_session(session_name, df, content_hash, file_path)
         except Exception as e:
             logger.error(f"加载文件失败 {file_path}: {e}")
 
+    def _load_workbook_sheets(
+        self, file_path, file_stem, content, content_hash, sheet_names, infos=None
+    ):
+        """
+        多工作表文件：每个工作表作为一个场次，日期范围外的工作表不解析
+        其余工作表多进程并行解析，每个进程只打开一次工作簿
+        """
+        if infos is None or not {info.sheet for info in infos} <= set(sheet_names):
+            # 建立索引后文件有变化，重新按工作表名称筛选
+            index = SessionIndex()
+            index.add_workbook(file_stem, file_path, sheet_names)
+            infos = index.select(self.date_range)
+        infos = {info.sheet: info for info in infos}
+
+        sheets = read_workbook_sheets(content, [s for s in sheet_names if s in infos])
+        # 解析了全部工作表且只有一个有商品数据时，与单工作表文件一样使用文件名
+        single = single_data_sheet(sheets) if len(sheets) == len(sheet_names) else None
+        loaded = []
+        for sheet, df in sheets.items():
+            info = infos[sheet]
+            if not is_session_sheet(df):
+                logger.warning(f"工作表 {sheet} 没有商品数据，已跳过: {file_path}")
+                if self.session_manifest is not None:
+                    self.session_manifest.mark_empty_sheet(
+                        info.name, file_path, sheet, self.rule_engine.version
+                    )
+                continue
+            loaded.append(
+                self._add_raw_session(
+                    file_stem if sheet == single else info.name,
+                    df,
+                    sheet_signature(content_hash, sheet),
+                    file_path,
+                    sheet=sheet,
+                )
+            )
+
+        if loaded:
+            # 整个文件与之后的文件完全相同时，按文件内容哈希跳过
+            self._content_hashes[content_hash] = loaded[0]
+        logger.info(f"已从 {file_path} 加载 {len(loaded)}/{len(sheet_names)} 个工作表")
+
+    def _unique_session_name(self, session_name, source_path=None, sheet=None):
+        """
+        场次名称与已加载的场次重名时加以区分：工作表改为 文件名_工作表名称，
+        上传的场次加“_上传”，仍然重名时再加 _2、_3 等后缀
+        """
+        if session_name not in self.session_data:
+            return session_name
+        if source_path is None:
+            base = f"{session_name}_上传"
+        elif sheet is not None:
+            base = f"{Path(source_path).stem}_{sheet}"
+        else:
+            base = session_name
+        name, i = base, 2
+        while name in self.session_data:
+            name = f"{base}_{i}"
+            i += 1
+        logger.warning(
+            f"场次名称 {session_name} 与已加载的场次重名，改为 {name}: {source_path or '上传'}"
+        )
+        return name
+
+    def _add_raw_session(self, session_name, df, content_hash, source_path=None, sheet=None):
+        """
+        加入一个已解析的原始场次数据，返回场次名称（与已加载的场次重名时会改名）
+        source_path 为None表示来自上传，sheet 为多工作表文件中的工作表名称
+        """
+        session_name = self._unique_session_name(session_name, source_path, sheet)
+        # 文件不同但数据行完全相同，可能是同一份导出的不同版本，提示但仍然加载
+        rows_hash = hash_rows(df)
+        near_duplicate_of = self._row_hashes.get(rows_hash)
+        if near_duplicate_of is not None:
+            logger.warning(
+                f"场次 {session_name} 的数据行与场次 {near_duplicate_of} 完全相同，可能重复导入"
+            )
+            self.ingestion_report.add_near_duplicate(
+                session_name, source_path or "上传", near_duplicate_of
+            )
+        else:
+            self._row_hashes[rows_hash] = session_name
+
+        df["场次"] = session_name
+        self.session_data[session_name] = df
+        self.session_signatures[session_name] = content_hash
+        self._content_hashes[content_hash] = session_name
+        self.ingestion_report.add_loaded(session_name, source_path or "上传")
+        info = self.session_index.add(
+            session_name, path=str(source_path) if source_path else None, sheet=sheet
+        )
+        # 文件名中没有日期时，使用首次上架时间推断
+        if info.date is None and "首次上架时间" in df.columns:
+            self.session_index.set_date(
+                session_name, date_from_listing_time(df["首次上架时间"])
+            )
+        logger.info(f"已加载场次: {session_name}, 数据条数: {len(df)}")
+        return session_name
+
+    def _sort_sessions(self):
+        """按场次日期和序号排列场次数据"""
+        self.session_data = {
+            name: self.session_data[name]
+            for name in self.session_index.sorted_names()
+            if name in self.session_data
+        }
+
     def get_sku_from_title(self):
         """为所有场次的数据提取SKU"""
-        black_list = [
-            "Chanel/香奈儿蔚蓝男士淡香水EDT100ml 男士留香夏日魅力少年经典",
-            "拉布布POPMART泡泡玛特三代搪胶脸毛绒公仔玩具可爱盲盒",
-            "HELMER复古圆框墨镜女网红金属小框太阳镜韩版时尚遮阳眼镜男3381",
-        ]
-        regex_rules = [
-            # 主要模式：美区[前缀]-货号
-            r"美区[^-]*-([A-Z]*\d+[A-Z#]*|\d+[A-Z#]*|[A-Z]+\d+)",
-            # 【款号XXX琪】格式
-            r"【款号([A-Z]*\d+[A-Z]*|\d+[A-Z]*|[A-Z]+\d+)琪】",
-            # 多层级格式：美区大牌奢品-描述-描述-货号
-            r"美区[^-]*-.*?-.*?-([A-Z]*\d+[A-Z]*|\d+[A-Z]*|[A-Z]+\d+)",
-            # 通用模式：-货号（作为后备）
-            r"-([A-Z]\d+|\d+[A-Z]?|\d+)(?:[^A-Z\d]|$|#)",
-            # 【TX】货号格式
-            r"【[A-Z]+】([A-Z]*\d+[A-Z]*|\d+[A-Z]*|[A-Z]+\d+)",
-            # 纯货号格式（如DC007）
-            r"([A-Z]+\d+)(?:\s|$)",
-        ]
+        self.rule_engine.reload_if_changed()
+        # 统计只属于本次提取，不使用全局引擎上的共享计数
+        stats = self.rule_engine.new_stats()
+        self.unmatched_report = UnmatchedTitleReport()
+        self.sku_mapping = {}
+        self.auto_assigned = {}
+
+        for session_name in self.session_data:
+            self._extract_session_skus(session_name, stats)
+        self.rule_stats = stats.to_dataframe()
+
+        # 汇总写出，避免逐行写日志
+        self._finish_sku_extraction()
+
+    def _finish_sku_extraction(self):
+        """为未匹配的标题查找相似的已知标题，写出报告并保存标题索引"""
+        top_k = self.rule_engine.suggest_top_k
+        if top_k and len(self.title_index):
+            self.unmatched_report.set_suggestions(
+                {
+                    title: self.title_index.query(title, top_k)
+                    for title in self.unmatched_report.counts
+                }
+            )
+        self.unmatched_report.write()
+        if self.auto_assigned:
+            logger.info(f"按相似标题自动匹配SKU {len(self.auto_assigned)} 个标题")
+        if self.title_index.path is not None:
+            self.title_index.save()
+
+    def _extract_session_skus(self, session_name, stats=None):
+        """为单个场次提取SKU，未匹配的标题记入报告；stats 为本次提取的规则统计"""
+        engine = self.rule_engine
+        df = self.session_data[session_name]
+        titles = df["商品名称"]
+        # 过滤黑名单
+        df = df[~titles.isin(engine.black_list)].copy()
+        titles = df["商品名称"]
+
+        # 同一标题只匹配一次
+        sku_map = {title: engine.extract(title, stats) for title in titles.unique()}
+
+        # 规则匹配到的标题加入相似标题索引，规则已无法匹配的标题从索引中失效
+        unmatched = [title for title, sku in sku_map.items() if sku is None]
+        self.title_index.add_titles(
+            {title: sku for title, sku in sku_map.items() if sku is not None}
+        )
+        self.title_index.discard(unmatched)
+
+        # 相似度达到阈值时自动采用最相似标题的SKU
+        threshold = engine.auto_assign_threshold
+        if threshold is not None:
+            for title in unmatched:
+                best = self.title_index.query(title, 1)
+                if best and best[0][2] >= threshold:
+                    sku_map[title] = best[0][0]
+                    self.auto_assigned[title] = best[0]
+
+        df["SKU"] = titles.map(sku_map)
+        self.sku_mapping.update(sku_map)
+        self.session_data[session_name] = df
+
+        self.unmatched_report.add(session_name, titles[df["SKU"].isna()])
+
+    def clean_data(self, combine=True):
+        """
+        清理所有场次的数据
+        combine: 是否合并为完整数据 self.df，分区聚合时可以不合并以节省内存
+        """
+        for session_name in self.session_data:
+            self._clean_session(session_name)
 
-        for session_name, df in self.session_data.items():
-            for index, row in df.iterrows():
-                title = row["商品名称"]
-                if title in black_list:
-                    self.session_data[session_name] = self.session_data[
-                        session_name
-                    ].drop(index)
-                    continue
-                for rule in regex_rules:
-                    match = re.search(rule, title)
-                    if match:
-                        sku = match.group(1)
-                        self.session_data[session_name].at[index, "SKU"] = sku
-                        break
-                else:
-                    logger.error(f"场次 {session_name} 问题title: {title}")
-
-    def clean_data(self):
-        """清理所有场次的数据"""
-        for session_name, df in self.session_data.items():
-            cleaned_df = self._clean_single_dataframe(df)
-            self.session_data[session_name] = cleaned_df
+        if self.session_manifest is not None:
+            self.session_manifest.save()
 
         # 合并所有场次的数据
-        if self.session_data:
+        if combine and self.session_data:
+            self.df = pd.concat(self.session_data.values(), ignore_index=True)
+
+    def _clean_session(self, session_name):
+        """清理单个场次并更新索引"""
+        cleaned_df = self._clean_single_dataframe(self.session_data[session_name])
+        self.session_data[session_name] = cleaned_df
+        self._index_session(session_name, cleaned_df)
+
+    def add_uploaded_sessions(self, uploads):
+        """
+        将上传的场次增量合并到已加载的数据中，只处理新加入的场次，然后重新聚合
+        uploads: [(场次名称, 原始数据, 文件内容哈希)]，与已加载文件内容相同的跳过
+        返回新加入的场次名称
+        """
+        added = []
+        for session_name, raw_df, content_hash in uploads:
+            duplicate_of = self._content_hashes.get(content_hash)
+            if duplicate_of is not None:
+                logger.warning(f"上传文件与场次 {duplicate_of} 完全相同，已跳过: {session_name}")
+                self.ingestion_report.add_skipped(session_name, "上传", duplicate_of)
+                continue
+            added.append(self._add_raw_session(session_name, raw_df.copy(), content_hash))
+
+        if not added:
+            return added
+
+        self.rule_engine.reload_if_changed()
+        stats = self.rule_engine.new_stats()
+        for session_name in added:
+            self._extract_session_skus(session_name, stats)
+        self.rule_stats = merge_rule_stats(self.rule_stats, stats.to_dataframe())
+        self._finish_sku_extraction()
+
+        for session_name in added:
+            self._clean_session(session_name)
+        self._sort_sessions()
+
+        if self.df is not None or len(self.session_data) == len(added):
             self.df = pd.concat(self.session_data.values(), ignore_index=True)
+        self.aggregate_by_sku()
+        logger.info(f"已合并上传场次: {', '.join(added)}")
+        return added
+
+    def _index_session(self, session_name, cleaned_df):
+        """场次清理完成后，增量更新各类索引和汇总"""
+        self.sku_index.add_session(session_name, cleaned_df)
+        info = self.session_index.get(session_name)
+        if info is not None:
+            self.rollups.add_session(session_name, info.date, cleaned_df, info.seq)
+        if self.session_manifest is not None and info is not None and info.path:
+            self.session_manifest.update(
+                session_name,
+                info.path,
+                cleaned_df,
+                self.rule_engine.version,
+                info.date,
+                info.sheet,
+            )
 
     def _clean_single_dataframe(self, df):
         """清理单个数据框"""
@@ -205,59 +560,37 @@ class DataLoader:
 
         return new_df
 
-    def aggregate_by_sku(self):
-        """按SKU聚合数据，对数值列求和，对其他列保留第一个值"""
-        if self.df is None or self.df.empty:
-            logger.error("警告：没有数据可以聚合")
+    def aggregate_by_sku(self, workers=None):
+        """
+        按SKU聚合数据，对数值列求和，对其他列保留第一个值
+        workers: 大于1时按场次分区、多进程计算部分聚合后合并，不需要合并后的完整数据；
+                 未合并完整数据（clean_data(combine=False)）时也走分区聚合
+        """
+        if (workers is not None and workers > 1) or self.df is None:
+            if not self.session_data:
+                logger.error("警告：没有数据可以聚合")
+                return
+            self.aggregated_df = aggregate_partitioned(
+                self.session_data.values(), max_workers=workers
+            )
+            if self.aggregated_df is None:
+                logger.error("警告：没有数据可以聚合")
+                return
+            logger.info(f"SKU分区聚合完成，共 {len(self.aggregated_df)} 个SKU")
             return
 
-        # 定义需要求和的数值列
-        numeric_cols = ["商品点击人数", "成交件数", "用户支付金额", "讲解次数"]
-        # 定义需要保留第一个值的列
-        keep_first_cols = ["直播间价格", "首次上架时间"]
-        # 定义需要计算平均值的列
-        avg_cols = ["商品点击-成交转化率（人数）"]
-
-        agg_dict = {}
-
-        # 添加求和列
-        for col in numeric_cols:
-            if col in self.df.columns:
-                agg_dict[col] = "sum"
-
-        # 添加保留第一个值的列
-        for col in keep_first_cols:
-            if col in self.df.columns:
-                agg_dict[col] = "first"
+        if self.df.empty:
+            logger.error("警告：没有数据可以聚合")
+            return
 
-        # 添加平均值列
-        for col in avg_cols:
-            if col in self.df.columns:
-                agg_dict[col] = "mean"
+        # 求和列、首值列、均值列的聚合方式
+        agg_dict = build_agg_dict(self.df.columns)
 
         # 执行聚合
         self.aggregated_df = self.df.groupby("SKU").agg(agg_dict).reset_index()
 
-        # 重新计算讲解效率
-        if (
-            "成交件数" in self.aggregated_df.columns
-            and "讲解次数" in self.aggregated_df.columns
-        ):
-            self.aggregated_df["成交件数/每次讲解"] = (
-                self.aggregated_df["成交件数"] / self.aggregated_df["讲解次数"]
-            ).round(2)
-
-        # 重新计算单次讲解成交金额（聚合后重新计算，而不是取平均值）
-        if (
-            "用户支付金额" in self.aggregated_df.columns
-            and "讲解次数" in self.aggregated_df.columns
-        ):
-            # 避免除零错误
-            mask = self.aggregated_df["讲解次数"] > 0
-            self.aggregated_df.loc[mask, "单次讲解成交金额"] = (
-                self.aggregated_df.loc[mask, "用户支付金额"] / self.aggregated_df.loc[mask, "讲解次数"]
-            ).round(2)
-            self.aggregated_df.loc[~mask, "单次讲解成交金额"] = 0
+        # 重新计算讲解效率和单次讲解成交金额
+        add_derived_metrics(self.aggregated_df)
 
         logger.info(f"SKU聚合完成，共 {len(self.aggregated_df)} 个SKU")
 
@@ -286,19 +619,106 @@ class DataLoader:
             "单次讲解成交金额",
         ]
 
+        session_names = self.get_session_names()
         for col in numeric_cols:
             if col in combined_df.columns:
                 pivot_table = combined_df.pivot_table(
                     index="SKU", columns="场次", values=col, aggfunc="sum", fill_value=0
                 )
-                comparison_data[col] = pivot_table
+                # 场次按时间顺序排列
+                comparison_data[col] = pivot_table.reindex(
+                    columns=[n for n in session_names if n in pivot_table.columns]
+                )
 
         return comparison_data
 
+    def get_combined_data(self):
+        """所有场次的合并数据；未合并完整数据（clean_data(combine=False)）时临时合并，不保存"""
+        if self.df is not None or not self.session_data:
+            return self.df
+        return pd.concat(self.session_data.values(), ignore_index=True)
+
+    def get_metric_matrices(self, metrics):
+        """
+        获取 SKU × 场次 的指标矩阵（场次按时间顺序），SKU未出现的场次为NaN
+        比率指标按场次汇总后重新计算，而不是对行求和
+        """
+        if not self.session_data:
+            return {}
+        combined = self.get_combined_data()
+        per_session = combined.groupby(["SKU", "场次"], sort=False).agg(
+            build_agg_dict(combined.columns)
+        )
+        add_derived_metrics(per_session)
+
+        session_names = self.get_session_names()
+        return {
+            metric: per_session[metric].unstack("场次").reindex(columns=session_names)
+            for metric in metrics
+            if metric in per_session.columns
+        }
+
+    @property
+    def data_version(self):
+        """数据版本标识：场次、数据来源或SKU规则变化时改变，用于缓存计算结果"""
+        key = repr(
+            (
+                [(name, self.session_signatures.get(name)) for name in self.session_data],
+                self.rule_engine.version,
+            )
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def get_auto_assigned(self):
+        """按相似标题自动匹配SKU的标题列表"""
+        rows = [
+            {"商品名称": title, "SKU": sku, "相似标题": similar_title, "相似度": score}
+            for title, (sku, similar_title, score) in self.auto_assigned.items()
+        ]
+        return pd.DataFrame(rows, columns=["商品名称", "SKU", "相似标题", "相似度"])
+
     def get_session_names(self):
-        """获取场次名称列表"""
+        """获取场次名称列表（按时间顺序）"""
         return list(self.session_data.keys())
 
+    def get_session_date(self, session_name):
+        """获取场次日期，无法识别时返回None"""
+        return self.session_index.get_date(session_name)
+
     def get_session_data(self, session_name):
         """获取指定场次的数据"""
         return self.session_data.get(session_name)
+
+    def get_sku_rows(self, sku):
+        """通过SKU索引获取该SKU在所有场次中的行（按场次时间顺序），不扫描完整数据"""
+        positions = self.sku_index.get_positions(sku)
+        session_names = [name for name in positions if name in self.session_data]
+        if not session_names:
+            return None
+        session_names.sort(key=self.session_index.sort_key)
+        return pd.concat(
+            [self.session_data[name].iloc[positions[name]] for name in session_names],
+            ignore_index=True,
+        )
+
+    def get_sku_history(self, sku):
+        """获取SKU逐场次的汇总表，并重新计算讲解效率和单次讲解成交金额"""
+        rows = self.get_sku_rows(sku)
+        if rows is None:
+            return None
+        agg_dict = build_agg_dict(rows.columns)
+        history = rows.groupby("场次", sort=False).agg(agg_dict).reset_index()
+        add_derived_metrics(history)
+        history.insert(
+            1, "日期", [self.get_session_date(name) for name in history["场次"]]
+        )
+        return history
+
+    def get_session_summary(self, session_name):
+        """获取场次摘要（行数、合计、价格范围、SKU列表）"""
+        if self.session_manifest is not None:
+            summary = self.session_manifest.get(session_name)
+            if summary is not None:
+                return summary
+        df = self.session_data.get(session_name)
+        return summarize_session(df) if df is not None else None
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# 每个指标计算的变化结果
+DELTA_KINDS = ["本场值", "上场值", "变化量", "变化率(%)", "滚动均值", "排名", "排名变化"]
+
+
+def _window_sums(values, window):
+    """沿场次方向每个窗口的合计（不足窗口长度时按已有场次计算）"""
+    padded = np.concatenate(
+        [np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1
+    )
+    ends = np.arange(1, values.shape[1] + 1)
+    starts = np.maximum(ends - window, 0)
+    return padded[:, ends] - padded[:, starts]
+
+
+def _rolling_mean(values, window):
+    """
+    沿场次方向的滚动均值，跳过NaN（与 rolling(window, min_periods=1).mean() 一致）
+    窗口内没有有效值时为NaN
+    """
+    valid = ~np.isnan(values)
+    sums = _window_sums(np.where(valid, values, 0.0), window)
+    counts = _window_sums(valid.astype(float), window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def compute_metric_deltas(pivot, window=3, presence=None):
+    """
+    计算单个指标的场次环比变化，pivot 为 SKU × 场次 的透视表（场次按时间顺序）
+    presence: SKU × 场次 的布尔表，SKU是否出现在该场次（可由 get_metric_matrices 中
+              求和类指标的 notna() 得到）；未出现的场次没有排名，
+              排名变化为NaN，避免缺席的SKU因补0并列垫底而产生虚假的排名变化
+    返回 {变化类型: 与 pivot 同形状的DataFrame}
+    """
+    # 讲解次数为0时“成交件数/每次讲解”等比值为 inf，按缺失处理，不参与变化、均值和排名
+    values = pivot.to_numpy(dtype=float)
+    values = np.where(np.isfinite(values), values, np.nan)
+    previous = np.full_like(values, np.nan)
+    previous[:, 1:] = values[:, :-1]
+
+    abs_change = values - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = np.where(previous != 0, abs_change / np.abs(previous) * 100, np.nan)
+
+    # 每场内按数值降序排名，并列取最小名次，未出现的SKU不参与排名
+    ranked = pd.DataFrame(values, index=pivot.index, columns=pivot.columns)
+    if presence is not None:
+        ranked = ranked.where(
+            presence.reindex(index=pivot.index, columns=pivot.columns, fill_value=False)
+        )
+    rank = ranked.rank(axis=0, method="min", ascending=False).to_numpy()
+    previous_rank = np.full_like(rank, np.nan)
+    previous_rank[:, 1:] = rank[:, :-1]
+
+    arrays = {
+        "本场值": values,
+        "上场值": previous,
+        "变化量": abs_change,
+        "变化率(%)": pct_change,
+        "滚动均值": _rolling_mean(values, window),
+        "排名": rank,
+        # 正数表示名次上升
+        "排名变化": previous_rank - rank,
+    }
+    return {
+        kind: pd.DataFrame(array, index=pivot.index, columns=pivot.columns)
+        for kind, array in arrays.items()
+    }
+
+
+def compute_session_deltas(comparison_data, window=3, presence=None):
+    """为 get_session_comparison_data 返回的每个指标计算场次变化"""
+    return {
+        metric: compute_metric_deltas(pivot, window, presence)
+        for metric, pivot in comparison_data.items()
+    }
+
+
+def delta_leaderboard(metric_deltas, session_name):
+    """取出某一场次的变化榜：每个SKU一行，包含本场值、变化量、变化率、滚动均值和排名变化"""
+    board = pd.DataFrame(
+        {kind: metric_deltas[kind][session_name] for kind in DELTA_KINDS}
+    )
+    board.index.name = "SKU"
+    return board
@@ -0,0 +1,8 @@
+from utils.LruCache import LruCache
+
+
+class FigureCache(LruCache):
+    """
+    图表缓存：(数据版本, 筛选参数, 图表类型) -> 已生成的图表，按最近使用淘汰
+    多个会话共享同一个缓存，读写加锁；图表在锁外生成，避免阻塞其他会话
+    """
@@ -0,0 +1,39 @@
+import pandas as pd
+
+
+class IngestionReport:
+    def __init__(self):
+        """记录一次加载中各文件的导入情况：已加载、完全重复跳过、内容相同但文件不同"""
+        self.loaded = []  # (场次, 文件)
+        self.skipped = []  # (场次, 文件, 重复的场次)
+        self.near_duplicates = []  # (场次, 文件, 内容相同的场次)
+        self.undated = []  # 按日期范围加载时，无法确定日期而没有读取的文件
+
+    def add_loaded(self, session_name, file_path):
+        self.loaded.append((session_name, str(file_path)))
+
+    def add_skipped(self, session_name, file_path, duplicate_of):
+        self.skipped.append((session_name, str(file_path), duplicate_of))
+
+    def add_near_duplicate(self, session_name, file_path, duplicate_of):
+        self.near_duplicates.append((session_name, str(file_path), duplicate_of))
+
+    def add_undated(self, file_path):
+        self.undated.append(str(file_path))
+
+    def to_dataframe(self):
+        """转换为表格，每个文件一行"""
+        rows = [
+            {"场次": name, "文件": path, "状态": "已加载", "重复场次": ""}
+            for name, path in self.loaded
+        ]
+        near = {name: duplicate_of for name, _, duplicate_of in self.near_duplicates}
+        for row in rows:
+            if row["场次"] in near:
+                row["状态"] = "已加载（疑似重复）"
+                row["重复场次"] = near[row["场次"]]
+        rows += [
+            {"场次": name, "文件": path, "状态": "重复已跳过", "重复场次": duplicate_of}
+            for name, path, duplicate_of in self.skipped
+        ]
+        return pd.DataFrame(rows, columns=["场次", "文件", "状态", "重复场次"])
@@ -0,0 +1,492 @@
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from utils import logger
+
+APP_PATH = Path(__file__).resolve().parent.parent / "streamlit_app.py"
+# 侧边栏在 Streamlit 页面中的根容器序号
+SIDEBAR_ROOT = 1
+
+# 合成数据的标题模板，覆盖各条SKU规则以及无法匹配的标题
+TITLE_TEMPLATES = [
+    "美区大牌-C{i:04d}",
+    "【款号{i:04d}琪】 包包",
+    "美区奢品-描述-描述-D{i:04d}",
+    "某商品-{i:04d} 新款",
+    "【TX】AB{i:04d}",
+    "无规则商品名称{i}",
+]
+
+
+def generate_synthetic_dataset(output_dir, n_sessions=10, n_rows=200, seed=0):
+    """
+    生成合成的场次数据文件，用于压力测试
+    每天一场，文件名为 YYYYMMDD_1.xlsx，每场从同一批商品中随机抽取 n_rows 个
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    titles = [
+        TITLE_TEMPLATES[i % len(TITLE_TEMPLATES)].format(i=i) for i in range(n_rows * 2)
+    ]
+    start = date(2025, 7, 1)
+    for s in range(n_sessions):
+        session_date = start + timedelta(days=s)
+        rows = [
+            {
+                "商品ID": i,
+                "商品名称": title,
+                "直播间价格": f"¥{rng.randint(10, 3000):,}.00",
+                "用户支付金额": f"¥{rng.randint(0, 90000):,}.50",
+                "商品点击人数": rng.randint(0, 500),
+                "成交件数": rng.randint(0, 50),
+                "讲解次数": rng.randint(0, 5),
+                "商品点击-成交转化率（人数）": f"{rng.random() * 20:.2f}%",
+                "首次上架时间": f"{session_date:%Y-%m-%d} 19:00:00",
+            }
+            for i, title in enumerate(rng.sample(titles, n_rows))
+        ]
+        pd.DataFrame(rows).to_excel(
+            output_dir / f"{session_date:%Y%m%d}_1.xlsx", index=False
+        )
+    logger.info(f"已生成 {n_sessions} 场合成数据: {output_dir}")
+    return output_dir
+
+
+def get_rss_mb(pid="self"):
+    """进程的常驻内存（MB）；无 /proc 时返回当前进程的峰值内存，其他进程返回None"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid != "self":
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    def __init__(self, interval=0.2, pid="self"):
+        """在后台线程中定期采样进程内存"""
+        self.interval = interval
+        self.pid = pid
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = get_rss_mb(self.pid)
+        if rss is not None:
+            self.samples.append(rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def _find(widgets, label):
+    """按标签查找控件，当前页面没有该控件时返回None"""
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    return None
+
+
+class _Scenario:
+    def __init__(self, session_id, data_path, rounds=3, seed=0):
+        """模拟一个分析人员：依次切换聚合分析筛选、场次对比前N个和单场分析场次"""
+        self.session_id = session_id
+        self.data_path = str(data_path)
+        self.rounds = rounds
+        self.rng = random.Random(seed + session_id)
+        self.timings = []  # (用户, 步骤, 耗时秒, CPU秒)
+        self.errors = []
+
+    def _widget(self, kind, label):
+        """侧边栏中指定类型和标签的控件，没有时返回None"""
+        raise NotImplementedError
+
+    def _rerun(self):
+        """重新运行一次页面，返回 (运行中的异常信息, 本进程CPU秒)"""
+        raise NotImplementedError
+
+    def _run(self, step):
+        start = time.perf_counter()
+        errors, cpu = self._rerun()
+        self.timings.append((self.session_id, step, time.perf_counter() - start, cpu))
+        self.errors.extend(f"{step}: {error}" for error in errors)
+
+    def _select_view(self, view):
+        selector = self._widget("selectbox", "选择分析视图")
+        if selector is None:
+            # 数据加载失败时页面上没有视图选择
+            self.errors.append(f"切换到{view}: 页面未显示分析视图选择")
+            return False
+        selector.set_value(view)
+        self._run(f"切换到{view}")
+        return True
+
+    def _aggregate_steps(self):
+        if not self._select_view("聚合分析"):
+            return
+        sort_column = self._widget("selectbox", "选择排序列")
+        if sort_column is not None and sort_column.options:
+            sort_column.set_value(self.rng.choice(sort_column.options))
+            self._run("聚合分析-排序列")
+        price = self._widget("slider", "直播间价格范围")
+        if price is not None:
+            low, high = price.min, price.max
+            cut = low + (high - low) * self.rng.uniform(0.1, 0.5)
+            price.set_value((cut, high))
+            self._run("聚合分析-价格范围")
+        direction = self._widget("radio", "排序方向")
+        if direction is not None:
+            direction.set_value(self.rng.choice(direction.options))
+            self._run("聚合分析-排序方向")
+
+    def _comparison_steps(self):
+        if not self._select_view("场次对比"):
+            return
+        for _ in range(2):
+            top_n = self._widget("slider", "显示前N个SKU")
+            if top_n is None:
+                break
+            top_n.set_value(self.rng.randint(top_n.min, top_n.max))
+            self._run("场次对比-前N个")
+
+    def _single_session_steps(self):
+        if not self._select_view("单场分析"):
+            return
+        session = self._widget("selectbox", "选择场次")
+        if session is not None and session.options:
+            for name in self.rng.sample(session.options, min(2, len(session.options))):
+                session = self._widget("selectbox", "选择场次")
+                if session is None:
+                    break
+                session.set_value(name)
+                self._run("单场分析-切换场次")
+
+    def run(self, barrier=None):
+        self._rerun()
+        # 所有用户的页面都初始化后再同时开始操作
+        if barrier is not None:
+            barrier.wait()
+        self._widget("text_input", "数据文件夹路径").set_value(self.data_path)
+        self._run("首次加载")
+        for _ in range(self.rounds):
+            self._aggregate_steps()
+            self._comparison_steps()
+            self._single_session_steps()
+        return self
+
+
+class SimulatedSession(_Scenario):
+    def __init__(self, session_id, data_path, rounds=3, seed=0, timeout=300):
+        """在本进程中用 AppTest 运行一个独立的应用实例"""
+        from streamlit.testing.v1 import AppTest
+
+        super().__init__(session_id, data_path, rounds, seed)
+        self.app = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+
+    def _widget(self, kind, label):
+        return _find(getattr(self.app.sidebar, kind), label)
+
+    def _rerun(self):
+        cpu_start = time.process_time()
+        self.app.run()
+        cpu = time.process_time() - cpu_start
+        return [e.value for e in self.app.exception], cpu
+
+
+class _ServerWidget:
+    def __init__(self, session, proto):
+        """服务端页面中的一个控件，set_value 记录与浏览器相同的控件状态，下次运行时发送"""
+        self.session = session
+        self.proto = proto
+        self.label = proto.label
+        self.options = list(getattr(proto, "options", []))
+        self.min = getattr(proto, "min", None)
+        self.max = getattr(proto, "max", None)
+
+    def set_value(self, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=self.proto.id)
+        if isinstance(value, str):
+            state.string_value = value
+        else:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            state.double_array_value.data[:] = [float(v) for v in values]
+        self.session.states[self.proto.id] = state
+
+
+class ServerSession(_Scenario):
+    def __init__(self, session_id, url, data_path, rounds=3, seed=0, timeout=300):
+        """
+        作为一个浏览器会话连接到运行中的 Streamlit 服务，通过 websocket 收发页面消息
+        多个会话共用服务的缓存、内存和CPU，与团队共用一个服务时相同
+        """
+        from websockets.sync.client import connect
+
+        super().__init__(session_id, data_path, rounds, seed)
+        self.timeout = timeout
+        ws_url = url.replace("http", "ws", 1).rstrip("/")
+        self.connection = connect(f"{ws_url}/_stcore/stream", max_size=None, open_timeout=timeout)
+        self.widgets = {}  # (控件类型, 标签) -> 侧边栏控件
+        self.states = {}  # 控件ID -> 控件状态
+
+    def _widget(self, kind, label):
+        proto = self.widgets.get((kind, label))
+        return _ServerWidget(self, proto) if proto is not None else None
+
+    def _rerun(self):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        self.connection.send(message.SerializeToString())
+
+        widgets, rendered, errors = {}, set(), []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.connection.recv(timeout=self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "script_finished":
+                break
+            if kind != "delta" or forward.delta.WhichOneof("type") != "new_element":
+                continue
+            element = forward.delta.new_element
+            element_type = element.WhichOneof("type")
+            proto = getattr(element, element_type)
+            if element_type == "exception":
+                errors.append(proto.message)
+            elif getattr(proto, "id", ""):
+                rendered.add(proto.id)
+                if forward.metadata.delta_path[:1] == [SIDEBAR_ROOT]:
+                    widgets[(element_type, proto.label)] = proto
+        self.widgets = widgets
+        # 与浏览器一样，只保留本次运行中仍然显示的控件状态
+        self.states = {key: state for key, state in self.states.items() if key in rendered}
+        # 服务端的CPU时间由所有会话共用，无法归到单次运行
+        return errors, np.nan
+
+    def close(self):
+        self.connection.close()
+
+
+def summarize_timings(timings):
+    """按步骤统计重新运行耗时的 p50/p95/最大值和单次运行CPU耗时的 p95（毫秒，服务模式下为空）"""
+    columns = ["步骤", "次数", "p50(ms)", "p95(ms)", "最大(ms)", "CPU p95(ms)"]
+    df = pd.DataFrame(timings, columns=["用户", "步骤", "耗时", "CPU"])
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    def stats(group):
+        ms = group["耗时"].to_numpy() * 1000
+        return pd.Series(
+            {
+                "次数": len(ms),
+                "p50(ms)": np.percentile(ms, 50),
+                "p95(ms)": np.percentile(ms, 95),
+                "最大(ms)": ms.max(),
+                "CPU p95(ms)": np.percentile(group["CPU"].to_numpy() * 1000, 95),
+            }
+        )
+
+    summary = df.groupby("步骤", sort=False)[["耗时", "CPU"]].apply(stats)
+    summary.loc["全部"] = stats(df)
+    summary["次数"] = summary["次数"].astype(int)
+    return summary.round(1).reset_index()
+
+
+def _session_worker(session_id, data_path, rounds, seed, barrier, results):
+    """工作进程：运行一个模拟用户，返回耗时、错误和本进程内存"""
+    rss_start = get_rss_mb()
+    try:
+        with RssSampler() as sampler:
+            session = SimulatedSession(session_id, data_path, rounds, seed)
+            session.run(barrier)
+        results.put(
+            {
+                "timings": session.timings,
+                "errors": session.errors,
+                "rss_start": rss_start,
+                "rss_peak": max(sampler.samples),
+            }
+        )
+    except Exception as e:
+        # 初始化失败时解除其他进程的等待，并把错误带回主进程
+        barrier.abort()
+        results.put({"timings": [], "errors": [f"用户{session_id}: {e}"]})
+
+
+def run_load_test(data_path, n_users=4, rounds=3, seed=0):
+    """
+    独立进程模式：每个用户在独立的进程中用 AppTest 运行一个应用实例
+    （AppTest 的 Runtime 在进程内唯一，同一进程的多个线程不能同时运行）
+    相当于每个用户各自使用一个服务，缓存不共用，每个用户都要首次加载一次数据；
+    衡量的是单个用户的独立成本，不是多个会话共用一个服务时的表现（见 run_server_load_test）
+    用户数超过CPU核数时各进程分时共用CPU，耗时会高于“CPU p95”
+    返回 (按步骤的耗时统计, 内存统计, 错误列表)
+    """
+    if n_users > (os.cpu_count() or 1):
+        logger.warning(
+            f"并发用户数 {n_users} 超过CPU核数 {os.cpu_count()}，耗时包含CPU争用"
+        )
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(n_users)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_session_worker,
+            args=(i, str(data_path), rounds, seed, barrier, results),
+        )
+        for i in range(n_users)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    timings = [t for report in reports for t in report["timings"]]
+    errors = [e for report in reports for e in report["errors"]]
+    measured = [report for report in reports if "rss_peak" in report]
+    memory = {
+        "单个用户进程起始RSS(MB)": round(
+            max((r["rss_start"] for r in measured), default=0), 1
+        ),
+        "单个用户进程峰值RSS(MB)": round(
+            max((r["rss_peak"] for r in measured), default=0), 1
+        ),
+    }
+    return summarize_timings(timings), memory, errors
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port=None, timeout=60):
+    """以无界面方式启动 streamlit run，等待服务就绪，返回 (进程, 地址)"""
+    port = port or _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "streamlit",
+            "run",
+            str(APP_PATH),
+            "--server.headless=true",
+            f"--server.port={port}",
+            "--browser.gatherUsageStats=false",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://localhost:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Streamlit 服务启动失败，退出码 {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Streamlit 服务在 {timeout} 秒内没有就绪")
+
+
+def _run_server_session(session_id, url, data_path, rounds, seed, barrier):
+    session = None
+    try:
+        session = ServerSession(session_id, url, data_path, rounds, seed)
+        return session.run(barrier)
+    except Exception as e:
+        # 连接失败时解除其他会话的等待
+        barrier.abort()
+        failed = session or _Scenario(session_id, data_path, rounds, seed)
+        failed.errors.append(f"用户{session_id}: {e}")
+        return failed
+    finally:
+        if session is not None:
+            session.close()
+
+
+def run_server_load_test(data_path, n_users=4, rounds=3, seed=0, url=None):
+    """
+    服务模式：启动一个 streamlit run 服务（或连接 url 指定的已有服务），
+    n_users 个会话通过 websocket 同时操作，与团队共用一个服务时相同：
+    各会话共用 st.cache_data / st.cache_resource、图表缓存和上传缓存，并争用同一进程的CPU
+    内存为该服务进程的RSS（连接已有服务时不统计）；单次运行的CPU时间无法区分会话，不统计
+    返回 (按步骤的耗时统计, 内存统计, 错误列表)
+    """
+    process = None
+    if url is None:
+        process, url = start_server()
+    # 服务的工作目录可能不同，使用绝对路径
+    data_path = str(Path(data_path).resolve())
+    barrier = threading.Barrier(n_users)
+
+    def run_sessions():
+        with ThreadPoolExecutor(max_workers=n_users) as executor:
+            return list(
+                executor.map(
+                    lambda i: _run_server_session(i, url, data_path, rounds, seed, barrier),
+                    range(n_users),
+                )
+            )
+
+    memory = {}
+    try:
+        if process is None:
+            sessions = run_sessions()
+        else:
+            rss_start = get_rss_mb(process.pid)
+            with RssSampler(pid=process.pid) as sampler:
+                sessions = run_sessions()
+            if rss_start is not None and sampler.samples:
+                memory = {
+                    "服务起始RSS(MB)": round(rss_start, 1),
+                    "服务峰值RSS(MB)": round(max(sampler.samples), 1),
+                    "服务结束RSS(MB)": round(sampler.samples[-1], 1),
+                }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    timings = [t for session in sessions for t in session.timings]
+    errors = [e for session in sessions for e in session.errors]
+    return summarize_timings(timings), memory, errors
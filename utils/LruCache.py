@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+
+class LruCache:
+    def __init__(self, max_entries=64):
+        """
+        按最近使用淘汰的缓存，多个会话共享同一个实例，读写加锁
+        超过 max_entries 时淘汰最久未使用的条目
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """命中时返回缓存的值并标记为最近使用，否则返回None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key, build):
+        """命中时直接返回缓存的值，否则调用 build() 生成并缓存；build 在锁外执行，不阻塞其他会话"""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
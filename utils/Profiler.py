@@ -0,0 +1,151 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from utils import logger
+
+# 性能分析文件与 app.log 放在同一目录
+PROFILE_DIR = "logs"
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+
+def describe_dataset(data_loader):
+    """数据规模：场次数、行数、SKU数和内存占用，随性能分析一起保存"""
+    session_rows = {name: len(df) for name, df in data_loader.session_data.items()}
+    frames = list(data_loader.session_data.values())
+    aggregated = data_loader.aggregated_df
+    return {
+        "data_path": str(data_loader.data_path),
+        "data_version": data_loader.data_version,
+        "date_range": [
+            d.isoformat() if d else None for d in (data_loader.date_range or (None, None))
+        ],
+        "sessions": len(session_rows),
+        "rows": sum(session_rows.values()),
+        "max_session_rows": max(session_rows.values(), default=0),
+        "columns": len(frames[0].columns) if frames else 0,
+        "skus": 0 if aggregated is None else len(aggregated),
+        "memory_mb": round(
+            sum(df.memory_usage(deep=True).sum() for df in frames) / 1024 / 1024, 1
+        ),
+    }
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        """定时采样指定线程的调用栈，按完整调用栈计数"""
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RerunProfiler:
+    def __init__(self, output_dir=PROFILE_DIR, interval=SAMPLE_INTERVAL, label="rerun"):
+        """
+        分析一次完整的页面运行：cProfile 记录每个函数的调用次数和耗时（.prof），
+        同时按固定间隔采样调用栈，输出火焰图使用的折叠栈格式（.folded），
+        数据规模等信息通过 annotate 记录，保存在同名 .json 文件中
+        """
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.label = label
+        self.info = {}
+        self.paths = {}
+        self._profile = None
+        self._sampler = None
+        self._started = None
+
+    def annotate(self, **info):
+        """附加数据规模、分析视图等信息"""
+        self.info.update(info)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._sampler = _StackSampler(threading.get_ident(), self.interval)
+        self._sampler.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profile.disable()
+        self._sampler.stop()
+        elapsed = time.perf_counter() - self._started
+        # st.rerun / st.stop 等控制流异常也保存已记录的部分
+        self.info["elapsed_s"] = round(elapsed, 3)
+        self.info["exception"] = exc_type.__name__ if exc_type else None
+        try:
+            self.save()
+        except OSError as e:
+            logger.error(f"保存性能分析失败: {e}")
+        return False
+
+    def save(self):
+        """写出 .prof、.folded 和 .json 三个文件，返回各文件路径"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"profile_{datetime.now():%Y%m%d-%H%M%S}_{self.label}_{os.getpid()}"
+        base = self.output_dir / stem
+
+        prof_path = base.with_suffix(".prof")
+        self._profile.dump_stats(prof_path)
+
+        folded_path = base.with_suffix(".folded")
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        info_path = base.with_suffix(".json")
+        self.info.update(
+            {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "sample_interval_s": self.interval,
+                "samples": sum(self._sampler.stacks.values()),
+                "python": sys.version.split()[0],
+            }
+        )
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(self.info, f, ensure_ascii=False, indent=2)
+
+        self.paths = {"prof": prof_path, "folded": folded_path, "info": info_path}
+        logger.info(
+            f"已保存性能分析: {prof_path}，耗时 {self.info['elapsed_s']} 秒，"
+            f"{self.info['samples']} 个采样"
+        )
+        return self.paths
+
+    def top_functions(self, limit=15, sort="cumulative"):
+        """耗时最多的函数，文本格式，便于直接查看"""
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,103 @@
+import pandas as pd
+from utils import logger
+from utils.SkuAggregator import partial_aggregate, merge_partials, finalize_partial
+
+# 时间粒度
+GRANULARITIES = ["日", "周", "月"]
+
+
+def period_key(session_date, granularity):
+    """计算场次日期所属的周期标识"""
+    if granularity == "日":
+        return session_date.isoformat()
+    if granularity == "周":
+        iso_year, iso_week, _ = session_date.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if granularity == "月":
+        return session_date.strftime("%Y-%m")
+    raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+class RollupStore:
+    def __init__(self):
+        """按日、周、月物化的SKU汇总表，随场次加入增量维护"""
+        self.session_partials = {}  # 场次 -> (排序键, 日期, 部分聚合结果)
+        self.tables = {g: {} for g in GRANULARITIES}  # 粒度 -> {周期: 汇总表}
+        self._dirty = {g: set() for g in GRANULARITIES}  # 需要重新合并的周期
+
+    def add_session(self, session_name, session_date, df, seq=0):
+        """加入（或替换）一个已清理的场次，只标记受影响的周期"""
+        if session_date is None:
+            logger.warning(f"场次 {session_name} 无法识别日期，未计入时间汇总")
+            return
+        if "SKU" not in df.columns:
+            return
+
+        self.remove_session(session_name)
+        self.session_partials[session_name] = (
+            (session_date, seq, session_name),
+            session_date,
+            partial_aggregate(df),
+        )
+        for granularity in GRANULARITIES:
+            self._dirty[granularity].add(period_key(session_date, granularity))
+
+    def remove_session(self, session_name):
+        """移除一个场次"""
+        entry = self.session_partials.pop(session_name, None)
+        if entry is None:
+            return
+        for granularity in GRANULARITIES:
+            self._dirty[granularity].add(period_key(entry[1], granularity))
+
+    def _refresh(self, granularity):
+        """重新合并有变化的周期"""
+        dirty = self._dirty[granularity]
+        if not dirty:
+            return
+        period_partials = {period: [] for period in dirty}
+        for sort_key, session_date, partial in sorted(
+            self.session_partials.values(), key=lambda entry: entry[0]
+        ):
+            period = period_key(session_date, granularity)
+            if period in period_partials:
+                period_partials[period].append(partial)
+
+        tables = self.tables[granularity]
+        for period, partials in period_partials.items():
+            if partials:
+                tables[period] = finalize_partial(merge_partials(partials))
+            else:
+                tables.pop(period, None)
+        dirty.clear()
+
+    def get_periods(self, granularity):
+        """获取某粒度下所有周期（按时间顺序）"""
+        self._refresh(granularity)
+        return sorted(self.tables[granularity])
+
+    def get_rollup(self, granularity, period):
+        """获取某个周期的SKU汇总表"""
+        self._refresh(granularity)
+        return self.tables[granularity].get(period)
+
+    def get_period_sessions(self, granularity, period):
+        """获取某个周期包含的场次"""
+        return [
+            name
+            for name, (sort_key, session_date, _) in sorted(
+                self.session_partials.items(), key=lambda item: item[1][0]
+            )
+            if period_key(session_date, granularity) == period
+        ]
+
+    def get_rollup_table(self, granularity):
+        """获取某粒度下所有周期的汇总，增加“周期”列"""
+        periods = self.get_periods(granularity)
+        if not periods:
+            return pd.DataFrame()
+        tables = self.tables[granularity]
+        return pd.concat(
+            [tables[period].assign(周期=period) for period in periods],
+            ignore_index=True,
+        )
@@ -0,0 +1,175 @@
+import re
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+# 场次文件名格式：20250701_1 -> 日期 2025-07-01，第1场
+SESSION_NAME_PATTERN = re.compile(r"(\d{8})(?:[_-](\d+))?")
+
+
+def parse_session_name(name):
+    """从场次名称中解析日期和场次序号，无法解析时日期为None"""
+    match = SESSION_NAME_PATTERN.search(str(name))
+    if not match:
+        return None, 0
+    try:
+        session_date = datetime.strptime(match.group(1), "%Y%m%d").date()
+    except ValueError:
+        return None, 0
+    seq = int(match.group(2)) if match.group(2) else 0
+    return session_date, seq
+
+
+def sheet_session_name(file_stem, sheet_name):
+    """
+    多工作表文件中工作表对应的场次名称
+    工作表名称本身含有日期（如 20250701_1）时直接使用，否则为 文件名_工作表名称
+    """
+    if parse_session_name(sheet_name)[0] is not None:
+        return sheet_name
+    return f"{file_stem}_{sheet_name}"
+
+
+def date_from_listing_time(series):
+    """从“首次上架时间”列推断场次日期（取最早的上架日期）"""
+    listing_time = pd.to_datetime(series, errors="coerce").min()
+    if pd.isna(listing_time):
+        return None
+    return listing_time.date()
+
+
+class SessionInfo:
+    """单个场次的索引信息"""
+
+    def __init__(self, name, path=None, session_date=None, seq=0, sheet=None):
+        self.name = name
+        self.path = path
+        self.date = session_date
+        self.seq = seq
+        self.sheet = sheet  # 多工作表文件中的工作表名称，单工作表文件为None
+
+    @property
+    def sort_key(self):
+        # 无日期的场次排在最后
+        return (self.date is None, self.date or date.min, self.seq, self.name)
+
+
+class SessionIndex:
+    def __init__(self):
+        """按日期和场次序号组织的场次索引"""
+        self.sessions = {}  # 场次名称 -> SessionInfo
+
+    @classmethod
+    def from_paths(cls, paths):
+        """根据文件路径建立索引，只解析文件名和工作表名称，不读取工作表数据"""
+        index = cls()
+        index.add_files([(Path(path).stem, path) for path in paths])
+        return index
+
+    @classmethod
+    def from_directory(cls, directory_path):
+        """根据文件夹中的xlsx文件建立索引"""
+        return cls.from_paths(Path(directory_path).glob("*.xlsx"))
+
+    def add(self, name, path=None, session_date=None, sheet=None):
+        """
+        添加场次，未指定日期时从名称中解析
+        工作表名称中含有日期时，日期和序号取自工作表名称（场次名称可能因重名加了文件名）
+        """
+        parsed_date, seq = parse_session_name(name)
+        if sheet is not None:
+            sheet_date, sheet_seq = parse_session_name(sheet)
+            if sheet_date is not None:
+                parsed_date, seq = sheet_date, sheet_seq
+        info = SessionInfo(name, path, session_date or parsed_date, seq, sheet)
+        self.sessions[name] = info
+        return info
+
+    def add_files(self, files):
+        """
+        添加场次文件 [(场次名称, 文件路径)]，只读取工作簿的工作表列表
+        包含多个工作表的文件，每个工作表作为一个场次（见 sheet_session_name）；
+        工作表场次与其他场次重名时，文件的场次名称优先，工作表场次改为 文件名_工作表名称
+        """
+        # WorkbookReader 依赖本模块的场次名称解析，在此处导入
+        from utils.WorkbookReader import file_sheet_names
+
+        workbooks = []
+        for name, path in files:
+            sheet_names = file_sheet_names(path)
+            if len(sheet_names) > 1:
+                workbooks.append((name, path, sheet_names))
+            else:
+                self.add(self.unique_name(name), path=str(path))
+        for name, path, sheet_names in workbooks:
+            self.add_workbook(name, path, sheet_names)
+
+    def add_workbook(self, file_name, path, sheet_names):
+        """添加多工作表文件的各工作表场次，返回 [SessionInfo]"""
+        infos = []
+        for sheet in sheet_names:
+            session_name = sheet_session_name(file_name, sheet)
+            if session_name in self.sessions:
+                session_name = self.unique_name(f"{file_name}_{sheet}")
+            infos.append(self.add(session_name, path=str(path), sheet=sheet))
+        return infos
+
+    def unique_name(self, name):
+        """与已有场次重名时依次加上 _2、_3 等后缀"""
+        candidate, i = name, 2
+        while candidate in self.sessions:
+            candidate = f"{name}_{i}"
+            i += 1
+        return candidate
+
+    def set_date(self, name, session_date):
+        """为文件名中没有日期的场次补充日期"""
+        if name in self.sessions and session_date is not None:
+            self.sessions[name].date = session_date
+
+    def get(self, name):
+        return self.sessions.get(name)
+
+    def get_date(self, name):
+        info = self.sessions.get(name)
+        return info.date if info else None
+
+    def sort_key(self, name):
+        """场次的排序键，未索引的场次排在最后"""
+        info = self.sessions.get(name)
+        return info.sort_key if info else (True, date.min, 0, name)
+
+    def sorted_sessions(self):
+        """按时间顺序返回所有场次"""
+        return sorted(self.sessions.values(), key=lambda info: info.sort_key)
+
+    def sorted_names(self):
+        return [info.name for info in self.sorted_sessions()]
+
+    def select(self, date_range=None):
+        """
+        按日期范围筛选场次（包含首尾），按时间顺序返回
+        date_range: (开始日期, 结束日期)，任一端为None表示不限；无日期的场次不会被选中
+        """
+        sessions = self.sorted_sessions()
+        if not date_range:
+            return sessions
+        start, end = date_range
+        return [
+            info
+            for info in sessions
+            if info.date is not None
+            and (start is None or info.date >= start)
+            and (end is None or info.date <= end)
+        ]
+
+    def date_bounds(self):
+        """返回所有有日期场次的最早和最晚日期"""
+        dates = [info.date for info in self.sessions.values() if info.date is not None]
+        if not dates:
+            return None, None
+        return min(dates), max(dates)
+
+    def __len__(self):
+        return len(self.sessions)
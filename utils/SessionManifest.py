@@ -0,0 +1,243 @@
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+from utils import logger
+
+# 缓存目录放在数据文件夹下
+CACHE_DIR_NAME = ".cache"
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def get_cache_dir(data_path):
+    """根据数据路径确定缓存目录：文件夹下的 .cache，单个文件或文件列表则使用其所在文件夹"""
+    if isinstance(data_path, (list, tuple)):
+        if not data_path:
+            return None
+        data_path = data_path[0]
+    path = Path(data_path)
+    folder = path if path.is_dir() else path.parent
+    return folder / CACHE_DIR_NAME
+
+
+def file_signature(file_path):
+    """文件的大小和修改时间，用于判断摘要是否过期"""
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def summarize_session(df):
+    """计算场次摘要：行数、各项合计、价格范围和SKU列表"""
+
+    def column_sum(col):
+        return df[col].sum().item() if col in df.columns else None
+
+    summary = {
+        "rows": len(df),
+        "total_payment": column_sum("用户支付金额"),
+        "total_clicks": column_sum("商品点击人数"),
+        "total_deals": column_sum("成交件数"),
+        "price_min": None,
+        "price_max": None,
+        "skus": [],
+    }
+    if "直播间价格" in df.columns and df["直播间价格"].notna().any():
+        summary["price_min"] = float(df["直播间价格"].min())
+        summary["price_max"] = float(df["直播间价格"].max())
+    if "SKU" in df.columns:
+        summary["skus"] = sorted(str(sku) for sku in df["SKU"].dropna().unique())
+    return summary
+
+
+class SessionManifest:
+    def __init__(self, cache_dir):
+        """
+        场次摘要清单，保存在缓存目录的 manifest.json 中
+        同时在 sessions/ 下保存清理后的场次数据，按需加载
+        """
+        self.cache_dir = Path(cache_dir)
+        self.path = self.cache_dir / MANIFEST_FILE_NAME
+        self.entries = {}  # 场次名称 -> 摘要
+        self._sources = {}  # (来源文件, 工作表) -> 场次名称
+        self.load()
+
+    @classmethod
+    def for_data_path(cls, data_path):
+        cache_dir = get_cache_dir(data_path)
+        return cls(cache_dir) if cache_dir is not None else None
+
+    def load(self):
+        """读取清单文件，不存在或损坏时为空"""
+        if not self.path.is_file():
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("sessions", {})
+        except (OSError, ValueError) as e:
+            logger.error(f"读取场次摘要失败 {self.path}: {e}")
+            self.entries = {}
+        self._sources = {
+            (entry["path"], entry.get("sheet")): name
+            for name, entry in self.entries.items()
+            if "path" in entry
+        }
+
+    def save(self):
+        """写出清单文件"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # 临时文件按进程区分，多个进程同时写入时互不影响
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"sessions": self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"写入场次摘要失败 {self.path}: {e}")
+
+    def frame_path(self, session_name):
+        return self.cache_dir / "sessions" / f"{session_name}.pkl"
+
+    def is_fresh(self, session_name, source_path, rules_version):
+        """摘要对应的源文件和SKU规则都没有变化"""
+        entry = self.entries.get(session_name)
+        if entry is None or entry.get("rules_version") != rules_version:
+            return False
+        try:
+            if entry.get("source") != file_signature(source_path):
+                return False
+        except OSError:
+            return False
+        if "duplicate_of" in entry or entry.get("empty_sheet"):
+            return True
+        return self.frame_path(session_name).is_file()
+
+    def _set_entry(self, session_name, entry, source_path, sheet=None):
+        """写入记录及其来源；同一来源之前以其他名称记录的场次（如重名时改过名称）会被替换"""
+        entry["path"] = str(source_path)
+        entry["sheet"] = sheet
+        previous = self._sources.get((entry["path"], sheet))
+        if previous is not None and previous != session_name:
+            self.entries.pop(previous, None)
+        self._sources[(entry["path"], sheet)] = session_name
+        self.entries[session_name] = entry
+
+    def mark_duplicate(self, session_name, source_path, duplicate_of, rules_version):
+        """记录与其他场次内容完全相同、导入时被跳过的文件"""
+        try:
+            entry = {
+                "duplicate_of": duplicate_of,
+                "source": file_signature(source_path),
+                "rules_version": rules_version,
+            }
+            self._set_entry(session_name, entry, source_path)
+        except OSError as e:
+            logger.error(f"记录重复场次失败 {session_name}: {e}")
+
+    def mark_empty_sheet(self, session_name, source_path, sheet, rules_version):
+        """记录没有商品数据、导入时被跳过的工作表（如说明页）"""
+        try:
+            entry = {
+                "empty_sheet": True,
+                "source": file_signature(source_path),
+                "rules_version": rules_version,
+            }
+            self._set_entry(session_name, entry, source_path, sheet)
+        except OSError as e:
+            logger.error(f"记录跳过的工作表失败 {session_name}: {e}")
+
+    def update(
+        self, session_name, source_path, df, rules_version, session_date=None, sheet=None
+    ):
+        """写入场次摘要、场次日期和清理后的数据（源文件未变化时跳过）"""
+        entry = self.entries.get(session_name, {})
+        if (
+            "duplicate_of" not in entry
+            and not entry.get("empty_sheet")
+            and self.is_fresh(session_name, source_path, rules_version)
+        ):
+            entry["date"] = session_date.isoformat() if session_date else None
+            self._set_entry(session_name, entry, source_path, sheet)
+            return
+        try:
+            frame_path = self.frame_path(session_name)
+            frame_path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_pickle(frame_path)
+            entry = summarize_session(df)
+            entry["source"] = file_signature(source_path)
+            entry["rules_version"] = rules_version
+            entry["date"] = session_date.isoformat() if session_date else None
+            self._set_entry(session_name, entry, source_path, sheet)
+        except OSError as e:
+            logger.error(f"写入场次缓存失败 {session_name}: {e}")
+
+    def source_name(self, info, rules_version=None):
+        """
+        索引中的场次（来源文件和工作表）上次加载时记录的场次名称，没有记录时返回None
+        整个文件因与其他文件相同而被跳过时，工作表使用文件的记录；
+        指定 rules_version 时只返回仍然有效的记录
+        """
+        path = str(info.path)
+        for key in dict.fromkeys([(path, info.sheet), (path, None)]):
+            name = self._sources.get(key)
+            entry = self.entries.get(name)
+            # 场次名称之后可能改为记录其他来源
+            if entry is None or (entry.get("path"), entry.get("sheet")) != key:
+                continue
+            if rules_version is None or self.is_fresh(name, path, rules_version):
+                return name
+        return None
+
+    def get_fresh_entries(self, sessions, rules_version):
+        """
+        获取一组场次的摘要，sessions 为按时间顺序排列的 SessionInfo
+        按来源文件和工作表查找，返回的场次名称以加载时为准（可能因重名改过名称）
+        任一场次缺少有效摘要时返回None
+        """
+        entries = {}
+        duplicate_of = set()
+        for info in sessions:
+            name = self.source_name(info, rules_version)
+            if name is None:
+                return None
+            entry = self.entries[name]
+            if "duplicate_of" in entry:
+                duplicate_of.add(entry["duplicate_of"])
+            elif not entry.get("empty_sheet"):
+                entries[name] = entry
+        # 重复文件被跳过，但被重复的场次不在所选范围内时需要重新加载
+        if not duplicate_of <= set(entries):
+            return None
+        return entries
+
+    def cached_date(self, session_name, source_path):
+        """上次加载时确定的场次日期（如按首次上架时间推断），源文件变化后失效"""
+        entry = self.entries.get(session_name)
+        if not entry or not entry.get("date"):
+            return None
+        try:
+            if entry.get("source") != file_signature(source_path):
+                return None
+        except OSError:
+            return None
+        return date.fromisoformat(entry["date"])
+
+    def apply_cached_dates(self, index):
+        """为文件名中没有日期的场次补充上次加载时确定的日期，使其可以按日期范围筛选"""
+        for info in index.sessions.values():
+            if info.date is None and info.path:
+                name = self.source_name(info)
+                if name is not None:
+                    index.set_date(info.name, self.cached_date(name, info.path))
+        return index
+
+    def get(self, session_name):
+        return self.entries.get(session_name)
+
+    def read_frame(self, session_name):
+        """按需加载清理后的场次数据"""
+        frame_path = self.frame_path(session_name)
+        if not frame_path.is_file():
+            return None
+        return pd.read_pickle(frame_path)
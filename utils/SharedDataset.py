@@ -0,0 +1,197 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+from utils import logger
+from utils.SessionIndex import SessionIndex
+from utils.SessionManifest import SessionManifest, file_signature, get_cache_dir
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow 为可选依赖，只有共享数据集模式需要
+    pa = None
+
+# 共享数据集保存在缓存目录下
+SHARED_DIR_NAME = "shared"
+DATASET_FILE_NAME = "dataset.arrow"
+AGGREGATED_FILE_NAME = "aggregated.arrow"
+METADATA_KEY = b"live_sessions"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("共享数据集需要安装 pyarrow: pip install pyarrow")
+
+
+def get_shared_dir(data_path, date_range=None):
+    """共享数据集目录：数据文件夹的 .cache/shared，指定日期范围时每个范围单独一个子目录"""
+    cache_dir = get_cache_dir(data_path)
+    if cache_dir is None:
+        return None
+    shared_dir = cache_dir / SHARED_DIR_NAME
+    if date_range:
+        start, end = date_range
+        shared_dir = shared_dir / f"{start or ''}_{end or ''}"
+    return shared_dir
+
+
+def get_memory_usage():
+    """
+    当前进程的内存（MB）：RSS、PSS（共享页按进程数分摊）和 USS（进程独占）
+    共享的内存映射文件只计入 RSS 和 PSS，不计入 USS
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return None
+    return {
+        "RSS": round(usage.get("Rss", 0), 1),
+        "PSS": round(usage.get("Pss", 0), 1),
+        "USS": round(usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0), 1),
+    }
+
+
+def _write_table(df, path, metadata=None):
+    """写出不压缩的 Arrow IPC 文件（压缩后无法直接内存映射），先写临时文件再替换"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata is not None:
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), METADATA_KEY: json.dumps(metadata)}
+        )
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def _read_table(path):
+    """内存映射打开 Arrow IPC 文件，数值列直接引用映射的页面，不复制"""
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    metadata = (table.schema.metadata or {}).get(METADATA_KEY)
+    # split_blocks 避免把同类型的列合并成一个新数组
+    df = table.to_pandas(split_blocks=True)
+    return df, json.loads(metadata) if metadata else None
+
+
+def write_shared_dataset(data_loader, directory):
+    """
+    将清理后的数据按场次时间顺序写成一个 Arrow 文件，聚合结果单独写一个文件
+    各场次的行范围、日期和来源文件签名记录在文件元数据中
+    """
+    _require_pyarrow()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    sessions = []
+    offset = 0
+    for name, df in data_loader.session_data.items():
+        info = data_loader.session_index.get(name)
+        source = None
+        if info is not None and info.path:
+            try:
+                source = file_signature(info.path)
+            except OSError:
+                pass
+        sessions.append(
+            {
+                "name": name,
+                "start": offset,
+                "stop": offset + len(df),
+                "date": info.date.isoformat() if info and info.date else None,
+                "path": info.path if info else None,
+                "sheet": info.sheet if info else None,
+                "source": source,
+                "signature": data_loader.session_signatures.get(name),
+            }
+        )
+        offset += len(df)
+
+    # 内容完全重复而被跳过的文件，判断数据集是否过期时需要
+    skipped = {}
+    for name, path, duplicate_of in data_loader.ingestion_report.skipped:
+        try:
+            skipped[name] = {
+                "path": path,
+                "duplicate_of": duplicate_of,
+                "source": file_signature(path),
+            }
+        except OSError:
+            pass
+
+    metadata = {
+        "sessions": sessions,
+        "skipped": skipped,
+        "undated": data_loader.ingestion_report.undated,
+        "rules_version": data_loader.rule_engine.version,
+        "date_range": [
+            d.isoformat() if d else None for d in (data_loader.date_range or (None, None))
+        ],
+    }
+    combined = pd.concat(data_loader.session_data.values(), ignore_index=True)
+    _write_table(combined, directory / DATASET_FILE_NAME, metadata)
+    if data_loader.aggregated_df is not None:
+        _write_table(data_loader.aggregated_df, directory / AGGREGATED_FILE_NAME)
+    logger.info(f"已写出共享数据集: {directory}，共 {len(sessions)} 场 {offset} 行")
+    return directory
+
+
+def read_shared_dataset(directory):
+    """内存映射打开共享数据集，返回 (合并数据, 聚合数据, 元数据)，不存在时返回None"""
+    _require_pyarrow()
+    directory = Path(directory)
+    dataset_path = directory / DATASET_FILE_NAME
+    if not dataset_path.is_file():
+        return None
+    df, metadata = _read_table(dataset_path)
+    aggregated_path = directory / AGGREGATED_FILE_NAME
+    aggregated = _read_table(aggregated_path)[0] if aggregated_path.is_file() else None
+    return df, aggregated, metadata
+
+
+def is_shared_dataset_fresh(directory, data_path, rules_version, date_range=None):
+    """
+    共享数据集是否与数据文件夹一致：所选场次、来源文件和SKU规则都没有变化
+    只读取文件元数据，不加载数据
+    """
+    if pa is None:
+        return False
+    dataset_path = Path(directory) / DATASET_FILE_NAME
+    if not dataset_path.is_file():
+        return False
+    try:
+        schema = pa.ipc.open_file(pa.memory_map(str(dataset_path), "r")).schema
+        metadata = json.loads(schema.metadata[METADATA_KEY])
+    except (OSError, KeyError, TypeError, ValueError, pa.ArrowException):
+        return False
+
+    if metadata.get("rules_version") != rules_version:
+        return False
+    expected_range = [d.isoformat() if d else None for d in (date_range or (None, None))]
+    if metadata.get("date_range") != expected_range:
+        return False
+
+    if os.path.isdir(data_path):
+        index = SessionIndex.from_directory(data_path)
+    else:
+        index = SessionIndex.from_paths([data_path])
+    if date_range:
+        SessionManifest.for_data_path(data_path).apply_cached_dates(index)
+    # 按来源文件比较：多工作表文件的各场次来自同一个文件
+    selected = [info.path for info in index.select(date_range)]
+    stored = {s["path"]: s["source"] for s in metadata["sessions"]}
+    stored.update({s["path"]: s["source"] for s in metadata.get("skipped", {}).values()})
+    if not stored or set(selected) != set(stored):
+        return False
+    for path in selected:
+        try:
+            if stored[path] != file_signature(path):
+                return False
+        except OSError:
+            return False
+    return True
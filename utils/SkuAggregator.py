@@ -0,0 +1,153 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# 需要求和的数值列
+SUM_COLS = ["商品点击人数", "成交件数", "用户支付金额", "讲解次数"]
+# 需要保留第一个值的列
+FIRST_COLS = ["直播间价格", "首次上架时间"]
+# 需要计算平均值的列
+AVG_COLS = ["商品点击-成交转化率（人数）"]
+
+# 部分聚合中保存均值所需的和与计数
+_AVG_SUM = "{}#sum"
+_AVG_COUNT = "{}#count"
+
+
+def build_agg_dict(columns):
+    """按列是否存在生成 groupby 聚合字典"""
+    agg_dict = {}
+    for col in SUM_COLS:
+        if col in columns:
+            agg_dict[col] = "sum"
+    for col in FIRST_COLS:
+        if col in columns:
+            agg_dict[col] = "first"
+    for col in AVG_COLS:
+        if col in columns:
+            agg_dict[col] = "mean"
+    return agg_dict
+
+
+def add_derived_metrics(df):
+    """根据聚合后的求和列重新计算讲解效率和单次讲解成交金额"""
+    # 重新计算讲解效率
+    if "成交件数" in df.columns and "讲解次数" in df.columns:
+        df["成交件数/每次讲解"] = (df["成交件数"] / df["讲解次数"]).round(2)
+
+    # 重新计算单次讲解成交金额（聚合后重新计算，而不是取平均值）
+    if "用户支付金额" in df.columns and "讲解次数" in df.columns:
+        # 避免除零错误
+        mask = df["讲解次数"] > 0
+        df.loc[mask, "单次讲解成交金额"] = (
+            df.loc[mask, "用户支付金额"] / df.loc[mask, "讲解次数"]
+        ).round(2)
+        df.loc[~mask, "单次讲解成交金额"] = 0
+    return df
+
+
+def partial_aggregate(df):
+    """
+    计算单个场次的部分聚合结果（以SKU为索引）
+    求和列保存和，首值列保存首个值，均值列保存和与计数，便于多个部分结果合并
+    """
+    named_aggs = {}
+    for col, func in build_agg_dict(df.columns).items():
+        if func == "mean":
+            named_aggs[_AVG_SUM.format(col)] = (col, "sum")
+            named_aggs[_AVG_COUNT.format(col)] = (col, "count")
+        else:
+            named_aggs[col] = (col, func)
+    return df.groupby("SKU").agg(**named_aggs)
+
+
+def merge_partials(partials):
+    """
+    合并多个部分聚合结果，partials 需按场次时间顺序排列
+    合并满足结合律：先合并任意相邻的部分结果再合并，结果不变
+    """
+    partials = [p for p in partials if p is not None]
+    if not partials:
+        return None
+    if len(partials) == 1:
+        return partials[0]
+
+    combined = pd.concat(partials)
+    agg_dict = {}
+    for col in combined.columns:
+        agg_dict[col] = "first" if col in FIRST_COLS else "sum"
+    return combined.groupby(level=0).agg(agg_dict)
+
+
+def finalize_partial(partial, exact_columns=None):
+    """
+    将部分聚合结果转换为与 aggregate_by_sku 相同格式的聚合表
+    exact_columns: 以SKU为索引、直接聚合得到的列，替换由部分结果计算的同名列
+    """
+    result = pd.DataFrame(index=partial.index)
+    for col in SUM_COLS + FIRST_COLS:
+        if col in partial.columns:
+            result[col] = partial[col]
+    for col in AVG_COLS:
+        if _AVG_SUM.format(col) in partial.columns:
+            result[col] = partial[_AVG_SUM.format(col)] / partial[_AVG_COUNT.format(col)]
+    if exact_columns is not None:
+        for col in exact_columns.columns:
+            result[col] = exact_columns[col]
+    result.index.name = "SKU"
+    return add_derived_metrics(result.reset_index())
+
+
+def _ordered_float_aggregates(frames):
+    """
+    均值列和含小数的求和列：按场次顺序拼接各场次的SKU和这几列后直接 groupby
+    浮点数的求和顺序与对合并后完整数据 groupby 时相同，结果逐位一致；
+    由部分结果的和再求和时求和顺序不同，末位可能不同（如 4.58 与 4.579999999999999）
+    只拼接这几列，不需要合并后的完整数据
+    """
+    columns = [
+        col
+        for col in AVG_COLS + SUM_COLS
+        if any(col in df.columns for df in frames)
+        and (
+            col in AVG_COLS
+            or any(pd.api.types.is_float_dtype(df[col]) for df in frames if col in df.columns)
+        )
+    ]
+    if not columns:
+        return None
+    agg_dict = {col: "mean" if col in AVG_COLS else "sum" for col in columns}
+    values = pd.concat(
+        [df.reindex(columns=["SKU"] + columns) for df in frames], ignore_index=True
+    )
+    return values.groupby("SKU").agg(agg_dict)
+
+
+def _aggregate_chunk(frames):
+    """工作进程：计算一组相邻场次的部分聚合并在本地合并"""
+    return merge_partials([partial_aggregate(df) for df in frames])
+
+
+def aggregate_partitioned(frames, max_workers=None):
+    """
+    按场次分区并行聚合，结果与对合并后的完整数据执行 groupby 逐位一致
+    frames: 按时间顺序排列的已清理场次数据
+    max_workers: 工作进程数，None 表示使用CPU核数
+    """
+    frames = [df for df in frames if df is not None and "SKU" in df.columns]
+    if not frames:
+        return None
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers <= 1 or len(frames) == 1:
+        return finalize_partial(_aggregate_chunk(frames), _ordered_float_aggregates(frames))
+
+    # 切分为相邻的场次块，保证“首值”列按场次顺序合并
+    n_chunks = min(len(frames), max_workers * 2)
+    chunk_size = -(-len(frames) // n_chunks)
+    chunks = [frames[i : i + chunk_size] for i in range(0, len(frames), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        partials = list(executor.map(_aggregate_chunk, chunks))
+    return finalize_partial(merge_partials(partials), _ordered_float_aggregates(frames))
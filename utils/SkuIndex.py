@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+
+class SkuIndex:
+    def __init__(self):
+        """
+        SKU到各场次行位置的索引，随场次加入增量维护
+        每个场次只保存三个数组：按SKU排序的行位置、排序后的SKU和每个SKU的起始偏移，
+        避免为每个 (SKU, 场次) 保存一个小数组（数量多时序列化和反序列化很慢）
+        """
+        self.sessions = {}  # 场次 -> (SKU数组, 偏移数组, 行位置数组)
+
+    def add_session(self, session_name, df):
+        """加入（或替换）一个已清理的场次，行位置对应 df 的位置索引"""
+        self.remove_session(session_name)
+        if "SKU" not in df.columns:
+            return
+        codes, skus = pd.factorize(df["SKU"], sort=True)
+        valid = codes >= 0
+        # 稳定排序，同一SKU的行保持原有顺序
+        rows = np.flatnonzero(valid)[np.argsort(codes[valid], kind="stable")]
+        counts = np.bincount(codes[valid], minlength=len(skus))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.sessions[session_name] = (
+            np.asarray(skus, dtype=str),
+            offsets.astype(np.int64),
+            rows.astype(np.int64),
+        )
+
+    def remove_session(self, session_name):
+        """移除一个场次"""
+        self.sessions.pop(session_name, None)
+
+    def get_positions(self, sku):
+        """获取SKU在各场次中的行位置，每个场次二分查找一次"""
+        sku = str(sku)
+        positions = {}
+        for session_name, (skus, offsets, rows) in self.sessions.items():
+            i = np.searchsorted(skus, sku)
+            if i < len(skus) and skus[i] == sku:
+                positions[session_name] = rows[offsets[i] : offsets[i + 1]]
+        return positions
+
+    def get_skus(self):
+        if not self.sessions:
+            return []
+        return np.unique(
+            np.concatenate([skus for skus, _, _ in self.sessions.values()])
+        ).tolist()
+
+    def __contains__(self, sku):
+        return bool(self.get_positions(sku))
+
+    def __len__(self):
+        return len(self.get_skus())
@@ -0,0 +1,193 @@
+import json
+import re
+import time
+from pathlib import Path
+
+import pandas as pd
+from utils import logger
+
+# 默认规则配置文件
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent.parent / "config" / "sku_rules.json"
+
+
+class SkuRule:
+    """单条SKU提取规则"""
+
+    def __init__(self, name, pattern, marker=None):
+        self.name = name
+        self.pattern = pattern
+        # 字面标记，标题中不包含该标记时跳过此规则；None表示总是尝试
+        self.marker = marker or None
+        self.regex = re.compile(pattern)
+        if self.regex.groups < 1:
+            raise ValueError(f"规则 {name} 的正则表达式没有捕获SKU的分组: {pattern}")
+
+
+class RuleStats:
+    def __init__(self, rules):
+        """
+        一次提取中各规则的尝试次数、命中次数和耗时
+        每次提取单独创建，不修改全局引擎上共享的规则对象，多个会话同时提取时统计互不影响
+        """
+        self._counts = {rule: [0, 0, 0.0] for rule in rules}  # 规则 -> [尝试, 命中, 秒]
+
+    def record(self, rule, seconds, hit):
+        counts = self._counts.setdefault(rule, [0, 0, 0.0])
+        counts[0] += 1
+        counts[1] += hit
+        counts[2] += seconds
+
+    def to_dataframe(self):
+        """转换为每条规则一行的统计表"""
+        rows = []
+        for rule, (attempts, hits, seconds) in self._counts.items():
+            rows.append(
+                {
+                    "规则": rule.name,
+                    "标记": rule.marker or "",
+                    "尝试次数": attempts,
+                    "命中次数": hits,
+                    "总耗时(ms)": round(seconds * 1000, 3),
+                    "平均耗时(μs)": (
+                        round(seconds / attempts * 1e6, 2) if attempts else 0.0
+                    ),
+                }
+            )
+        return pd.DataFrame(
+            rows, columns=["规则", "标记", "尝试次数", "命中次数", "总耗时(ms)", "平均耗时(μs)"]
+        )
+
+
+class SkuRuleEngine:
+    def __init__(self, config_path=DEFAULT_RULES_PATH):
+        """
+        SKU规则引擎
+        config_path: 规则配置文件路径（json），包含 black_list、rules 和 suggestions
+        """
+        self.config_path = Path(config_path)
+        self.version = None  # 配置文件的修改时间，用于热加载
+        self._failed_version = None  # 加载失败的配置文件修改时间，文件再次变化前不重试
+        self.black_list = frozenset()
+        self.rules = []
+        # 未匹配标题的相似标题建议数量，以及自动采用建议的相似度阈值（None表示不自动采用）
+        self.suggest_top_k = 3
+        self.auto_assign_threshold = None
+        self._markers = []
+        self._plans = {}  # 标记命中组合 -> 候选规则列表
+        self.reload()
+
+    def reload(self):
+        """
+        从配置文件重新加载并预编译规则
+        文件不完整、JSON格式错误或规则无效时记录错误并保留上一次成功加载的规则，
+        首次加载失败时抛出异常
+        """
+        if not self.config_path.is_file():
+            raise FileNotFoundError(f"SKU规则文件不存在: {self.config_path}")
+
+        version = self.config_path.stat().st_mtime_ns
+        try:
+            with open(self.config_path, encoding="utf-8") as f:
+                config = json.load(f)
+            rules = [
+                SkuRule(item.get("name", item["pattern"]), item["pattern"], item.get("marker"))
+                for item in config.get("rules", [])
+            ]
+            suggestions = config.get("suggestions", {})
+            black_list = frozenset(config.get("black_list", []))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, re.error) as e:
+            self._failed_version = version
+            if self.version is None:
+                raise ValueError(f"SKU规则文件无效 {self.config_path}: {e}") from e
+            logger.error(f"SKU规则文件无效，继续使用已加载的规则 {self.config_path}: {e}")
+            return False
+
+        self.black_list = black_list
+        self.rules = rules
+        self.suggest_top_k = suggestions.get("top_k", 3)
+        self.auto_assign_threshold = suggestions.get("auto_assign_threshold")
+        # 去重后的标记列表，保持出现顺序
+        self._markers = list(dict.fromkeys(r.marker for r in rules if r.marker))
+        self._plans = {}
+        self.version = version
+        self._failed_version = None
+        logger.info(f"已加载SKU规则 {len(rules)} 条，黑名单 {len(self.black_list)} 条")
+        return True
+
+    def reload_if_changed(self):
+        """配置文件有变化时重新加载，返回是否发生了重载"""
+        try:
+            version = self.config_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            logger.error(f"SKU规则文件不存在，继续使用已加载的规则: {self.config_path}")
+            return False
+        if version in (self.version, self._failed_version):
+            return False
+        return self.reload()
+
+    def new_stats(self):
+        """为一次提取创建规则统计，传给 extract 累加"""
+        return RuleStats(self.rules)
+
+    def _candidate_rules(self, title):
+        """按标题中出现的字面标记分派，只返回可能命中的规则（保持原有顺序）"""
+        key = tuple(marker in title for marker in self._markers)
+        plan = self._plans.get(key)
+        if plan is None:
+            present = {m for m, hit in zip(self._markers, key) if hit}
+            plan = [r for r in self.rules if r.marker is None or r.marker in present]
+            self._plans[key] = plan
+        return plan
+
+    def is_blacklisted(self, title):
+        """判断标题是否在黑名单中"""
+        return title in self.black_list
+
+    def extract(self, title, stats=None):
+        """
+        从标题中提取SKU，未命中任何规则时返回None
+        stats: new_stats() 创建的规则统计，传入时记录每条规则的尝试、命中和耗时
+        """
+        if not isinstance(title, str):
+            return None
+        for rule in self._candidate_rules(title):
+            if stats is None:
+                match = rule.regex.search(title)
+            else:
+                start = time.perf_counter()
+                match = rule.regex.search(title)
+                stats.record(rule, time.perf_counter() - start, match is not None)
+            if match:
+                return match.group(1)
+        return None
+
+
+def merge_rule_stats(old, new):
+    """合并两次提取的规则统计（如先加载文件夹、再合并上传文件），按规则累加"""
+    if old is None:
+        return new
+    merged = (
+        pd.concat([old, new], ignore_index=True)
+        .groupby(["规则", "标记"], sort=False, as_index=False)[
+            ["尝试次数", "命中次数", "总耗时(ms)"]
+        ]
+        .sum()
+    )
+    attempts = merged["尝试次数"]
+    merged["平均耗时(μs)"] = (
+        (merged["总耗时(ms)"] * 1000 / attempts.where(attempts > 0)).fillna(0.0).round(2)
+    )
+    return merged
+
+
+_default_engine = None
+
+
+def get_default_engine():
+    """获取全局默认规则引擎，并在配置文件变化时自动重载"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = SkuRuleEngine()
+    else:
+        _default_engine.reload_if_changed()
+    return _default_engine
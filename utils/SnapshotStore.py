@@ -0,0 +1,227 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from utils import logger
+from utils.SessionManifest import get_cache_dir
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow 为可选依赖，只有版本快照需要
+    feather = None
+
+# 快照保存在缓存目录下，每个版本一个子目录
+SNAPSHOT_DIR_NAME = "snapshots"
+META_FILE_NAME = "meta.json"
+# 默认保留的快照数量
+DEFAULT_KEEP = 20
+
+# 对比结果中的SKU状态
+STATUS_ADDED = "新增"
+STATUS_REMOVED = "移除"
+STATUS_CHANGED = "变化"
+STATUS_UNCHANGED = "未变"
+
+
+def _require_feather():
+    if feather is None:
+        raise ImportError("版本快照需要安装 pyarrow: pip install pyarrow")
+
+
+def get_snapshot_dir(data_path):
+    """快照目录：数据文件夹的 .cache/snapshots"""
+    cache_dir = get_cache_dir(data_path)
+    return cache_dir / SNAPSHOT_DIR_NAME if cache_dir is not None else None
+
+
+class SnapshotStore:
+    def __init__(self, root):
+        """
+        按版本保存清理后的数据、SKU聚合结果和标题到SKU的映射（zstd 压缩的 Feather 列存文件），
+        用于对比两次构建之间的变化
+        """
+        self.root = Path(root)
+
+    @classmethod
+    def for_data_path(cls, data_path):
+        root = get_snapshot_dir(data_path)
+        return cls(root) if root is not None else None
+
+    def _part_path(self, version_id, part):
+        return self.root / version_id / f"{part}.feather"
+
+    def list_snapshots(self):
+        """按时间倒序返回所有快照的元数据"""
+        if not self.root.is_dir():
+            return []
+        snapshots = []
+        for meta_path in self.root.glob(f"*/{META_FILE_NAME}"):
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"读取快照元数据失败 {meta_path}: {e}")
+        return sorted(snapshots, key=lambda meta: meta["id"], reverse=True)
+
+    def latest(self):
+        snapshots = self.list_snapshots()
+        return snapshots[0] if snapshots else None
+
+    def save(self, data_loader, label=None, keep=DEFAULT_KEEP):
+        """
+        保存当前构建结果为新版本，数据版本与最新快照相同时不重复保存
+        返回快照元数据
+        """
+        _require_feather()
+        latest = self.latest()
+        data_version = data_loader.data_version
+        if latest is not None and latest["data_version"] == data_version:
+            return latest
+
+        created = datetime.now()
+        version_id = f"{created:%Y%m%d-%H%M%S}-{data_version[:8]}"
+        parts = {
+            "cleaned": pd.concat(data_loader.session_data.values(), ignore_index=True),
+            "aggregated": data_loader.aggregated_df,
+            "sku_mapping": pd.DataFrame(
+                list(data_loader.sku_mapping.items()), columns=["商品名称", "SKU"]
+            ),
+        }
+        tmp_dir = self.root / f".{version_id}.{os.getpid()}.tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for part, df in parts.items():
+            if df is not None:
+                feather.write_feather(
+                    df.reset_index(drop=True),
+                    tmp_dir / f"{part}.feather",
+                    compression="zstd",
+                )
+        meta = {
+            "id": version_id,
+            "label": label or "",
+            "created": created.isoformat(timespec="seconds"),
+            "data_version": data_version,
+            "rules_version": data_loader.rule_engine.version,
+            "sessions": data_loader.get_session_names(),
+            "rows": sum(len(df) for df in data_loader.session_data.values()),
+            "skus": 0 if data_loader.aggregated_df is None else len(data_loader.aggregated_df),
+        }
+        with open(tmp_dir / META_FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_dir, self.root / version_id)
+        logger.info(f"已保存数据快照: {version_id}，{meta['rows']} 行，{meta['skus']} 个SKU")
+
+        self.prune(keep)
+        return meta
+
+    def load(self, version_id, part):
+        """读取快照中的一部分数据（cleaned / aggregated / sku_mapping），不存在时返回None"""
+        _require_feather()
+        path = self._part_path(version_id, part)
+        if not path.is_file():
+            return None
+        return feather.read_feather(path)
+
+    def prune(self, keep=DEFAULT_KEEP):
+        """只保留最新的 keep 个快照"""
+        for meta in self.list_snapshots()[keep:]:
+            shutil.rmtree(self.root / meta["id"], ignore_errors=True)
+
+    def diff(self, old_id, new_id, metrics=None):
+        """对比两个快照：SKU的增删和各指标变化，以及标题到SKU映射的变化"""
+        return {
+            "skus": diff_aggregated(
+                self.load(old_id, "aggregated"), self.load(new_id, "aggregated"), metrics
+            ),
+            "mapping": diff_sku_mapping(
+                self.load(old_id, "sku_mapping"), self.load(new_id, "sku_mapping")
+            ),
+        }
+
+
+def diff_aggregated(old, new, metrics=None):
+    """
+    按SKU外连接两个版本的聚合结果，计算每个数值指标的旧值、新值和变化量
+    状态为 新增 / 移除 / 变化 / 未变，结果按状态和变化幅度排序
+    """
+    old = old if old is not None else pd.DataFrame(columns=["SKU"])
+    new = new if new is not None else pd.DataFrame(columns=["SKU"])
+    if metrics is None:
+        metrics = [
+            col
+            for col in new.select_dtypes(include="number").columns
+            if col in old.columns
+        ]
+
+    merged = pd.merge(
+        old[["SKU"] + metrics],
+        new[["SKU"] + metrics],
+        on="SKU",
+        how="outer",
+        suffixes=("#旧", "#新"),
+        indicator=True,
+    )
+    old_values = merged[[f"{m}#旧" for m in metrics]].to_numpy(dtype=float)
+    new_values = merged[[f"{m}#新" for m in metrics]].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        # 讲解次数为0的比率为无穷大，inf - inf 为NaN
+        delta = new_values - old_values
+    # 两边都为NaN的指标不算变化，浮点误差以内的差异也不算
+    changed = ~np.isclose(old_values, new_values, equal_nan=True)
+
+    result = pd.DataFrame({"SKU": merged["SKU"]})
+    result["状态"] = np.select(
+        [
+            merged["_merge"] == "left_only",
+            merged["_merge"] == "right_only",
+            changed.any(axis=1),
+        ],
+        [STATUS_REMOVED, STATUS_ADDED, STATUS_CHANGED],
+        default=STATUS_UNCHANGED,
+    )
+    result["变化指标数"] = changed.sum(axis=1)
+    for i, metric in enumerate(metrics):
+        result[f"{metric}(旧)"] = old_values[:, i]
+        result[f"{metric}(新)"] = new_values[:, i]
+        result[f"{metric}(变化)"] = delta[:, i]
+
+    status_order = {STATUS_ADDED: 0, STATUS_REMOVED: 1, STATUS_CHANGED: 2, STATUS_UNCHANGED: 3}
+    return result.sort_values(
+        ["状态", "变化指标数"],
+        key=lambda col: col.map(status_order) if col.name == "状态" else -col,
+    ).reset_index(drop=True)
+
+
+def diff_sku_mapping(old, new):
+    """按商品名称外连接两个版本的标题映射，找出SKU被重新映射、新出现和消失的标题"""
+    columns = ["商品名称", "旧SKU", "新SKU", "状态"]
+    if old is None or new is None:
+        return pd.DataFrame(columns=columns)
+    merged = pd.merge(
+        old, new, on="商品名称", how="outer", suffixes=("_旧", "_新"), indicator=True
+    ).rename(columns={"SKU_旧": "旧SKU", "SKU_新": "新SKU"})
+    both = merged["_merge"] == "both"
+    remapped = both & (merged["旧SKU"].fillna("") != merged["新SKU"].fillna(""))
+    merged["状态"] = np.select(
+        [remapped, merged["_merge"] == "right_only", merged["_merge"] == "left_only"],
+        ["重新映射", "新标题", "标题消失"],
+        default="",
+    )
+    return merged.loc[merged["状态"] != "", columns].reset_index(drop=True)
+
+
+def summarize_diff(diff):
+    """对比结果的各状态数量"""
+    status_counts = diff["skus"]["状态"].value_counts()
+    mapping_counts = diff["mapping"]["状态"].value_counts()
+    return {
+        STATUS_ADDED: int(status_counts.get(STATUS_ADDED, 0)),
+        STATUS_REMOVED: int(status_counts.get(STATUS_REMOVED, 0)),
+        STATUS_CHANGED: int(status_counts.get(STATUS_CHANGED, 0)),
+        STATUS_UNCHANGED: int(status_counts.get(STATUS_UNCHANGED, 0)),
+        "重新映射": int(mapping_counts.get("重新映射", 0)),
+    }
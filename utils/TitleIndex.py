@@ -0,0 +1,179 @@
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+from utils import logger
+
+# 索引文件放在缓存目录下
+INDEX_FILE_NAME = "title_index.pkl"
+# 索引格式版本，格式变化时旧文件会被忽略并重建
+INDEX_FORMAT = 1
+
+
+def normalize_title(title):
+    """去掉空白并统一为小写，减少无意义的差异"""
+    return "".join(str(title).split()).lower()
+
+
+def title_ngrams(title, n=2):
+    """标题的字符 n-gram 集合，短于 n 的标题整体作为一个 gram"""
+    text = normalize_title(title)
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+class TitleNgramIndex:
+    def __init__(self, n=2):
+        """
+        已知SKU标题的字符 n-gram 倒排索引，用于为未匹配的标题查找最相似的已知标题
+        相似度为 Dice 系数：2 × 共同 gram 数 / (两个标题的 gram 数之和)
+        """
+        self.n = n
+        self.titles = []  # 标题ID -> 标题
+        self.skus = []  # 标题ID -> SKU，None表示该标题已不再匹配，查询时跳过
+        self.sizes = np.zeros(0, dtype=np.int32)  # 标题ID -> gram 数
+        self.postings = {}  # gram -> 包含该 gram 的标题ID数组
+        self._ids = {}  # 标题 -> 标题ID
+        self.path = None
+
+    @classmethod
+    def load(cls, path, n=2):
+        """从文件加载索引，不存在或格式不符时返回空索引"""
+        path = Path(path)
+        index = None
+        if path.is_file():
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                if state.get("format") == INDEX_FORMAT and state.get("n") == n:
+                    index = cls(n)
+                    index.titles = state["titles"]
+                    index.skus = state["skus"]
+                    index.sizes = state["sizes"]
+                    index.postings = state["postings"]
+                    index._ids = {title: i for i, title in enumerate(index.titles)}
+            except (OSError, pickle.UnpicklingError, EOFError, KeyError) as e:
+                logger.error(f"读取标题索引失败 {path}: {e}")
+        index = index or cls(n)
+        index.path = path
+        return index
+
+    def save(self, path=None):
+        """写出索引文件"""
+        path = Path(path or self.path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {
+                        "format": INDEX_FORMAT,
+                        "n": self.n,
+                        "titles": self.titles,
+                        "skus": self.skus,
+                        "sizes": self.sizes,
+                        "postings": self.postings,
+                    },
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            tmp_path.replace(path)
+        except OSError as e:
+            logger.error(f"写入标题索引失败 {path}: {e}")
+
+    def add_titles(self, mapping):
+        """
+        增量加入已知SKU的标题，mapping: 标题 -> SKU
+        已存在的标题只更新SKU，新标题的 gram 批量追加到倒排列表
+        """
+        new_postings = {}
+        new_sizes = []
+        for title, sku in mapping.items():
+            title_id = self._ids.get(title)
+            if title_id is not None:
+                self.skus[title_id] = sku
+                continue
+            title_id = len(self.titles)
+            self._ids[title] = title_id
+            self.titles.append(title)
+            self.skus.append(sku)
+            grams = title_ngrams(title, self.n)
+            new_sizes.append(len(grams))
+            for gram in grams:
+                new_postings.setdefault(gram, []).append(title_id)
+
+        if not new_sizes:
+            return 0
+        self.sizes = np.concatenate([self.sizes, np.array(new_sizes, dtype=np.int32)])
+        for gram, ids in new_postings.items():
+            ids = np.array(ids, dtype=np.int32)
+            existing = self.postings.get(gram)
+            self.postings[gram] = ids if existing is None else np.concatenate([existing, ids])
+        return len(new_sizes)
+
+    def discard(self, titles):
+        """标题按当前规则已无法匹配时，不再作为建议来源"""
+        for title in titles:
+            title_id = self._ids.get(title)
+            if title_id is not None:
+                self.skus[title_id] = None
+
+    def query(self, title, k=3):
+        """
+        查找与标题最相似的 k 个已知标题
+        返回 [(SKU, 相似标题, 相似度)]，按相似度降序
+        """
+        grams = title_ngrams(title, self.n)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+        # 每个标题与查询共同的 gram 数
+        overlap = np.bincount(np.concatenate(lists), minlength=len(self.titles))
+
+        # “美区”等常见 gram 几乎出现在所有标题中，共同 gram 数不为零的标题接近全部标题；
+        # 标题自身的 gram 数不少于共同 gram 数，共同数少于 t 的标题相似度低于
+        # 2(t-1)/(查询 gram 数+t-1)，先只对共同数较多的标题打分，
+        # 前 k 个的相似度都高于该上限时，结果与对全部标题打分相同
+        threshold = int(overlap.max()) // 2
+        if threshold > 1:
+            results = self._rank(overlap, len(grams), k, threshold)
+            bound = 2.0 * (threshold - 1) / (len(grams) + threshold - 1)
+            if len(results) == k and results[-1][2] > bound:
+                return self._rounded(results)
+        return self._rounded(self._rank(overlap, len(grams), k, 1))
+
+    def _rank(self, overlap, n_grams, k, min_overlap):
+        candidates = np.flatnonzero(overlap >= min_overlap)
+        scores = 2.0 * overlap[candidates] / (n_grams + self.sizes[candidates])
+
+        # 先取得分最高的一小部分排序，其中有效标题不足 k 个时再整体排序
+        top = min(len(candidates), k + 16)
+        order = np.argpartition(-scores, top - 1)[:top]
+        order = order[np.argsort(-scores[order], kind="stable")]
+        results = self._collect(candidates, scores, order, k)
+        if len(results) < k and top < len(candidates):
+            results = self._collect(
+                candidates, scores, np.argsort(-scores, kind="stable"), k
+            )
+        return results
+
+    def _collect(self, candidates, scores, order, k):
+        results = []
+        for i in order:
+            title_id = candidates[i]
+            sku = self.skus[title_id]
+            if sku is None:
+                continue
+            results.append((sku, self.titles[title_id], float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    @staticmethod
+    def _rounded(results):
+        return [(sku, title, round(score, 3)) for sku, title, score in results]
+
+    def __len__(self):
+        return len(self.titles)
@@ -0,0 +1,72 @@
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+from utils import logger
+
+# 默认报告输出位置，与 app.log 放在一起
+DEFAULT_REPORT_PATH = Path("logs") / "unmatched_titles.csv"
+
+
+class UnmatchedTitleReport:
+    def __init__(self):
+        """收集一次加载中所有未匹配SKU的标题，按标题去重计数"""
+        self.counts = Counter()  # 标题 -> 出现次数
+        self.sessions = {}  # 标题 -> 出现过的场次
+        self.suggestions = {}  # 标题 -> [(SKU, 相似标题, 相似度)]
+
+    def add(self, session_name, titles):
+        """记录某场次中未匹配的标题"""
+        for title in titles:
+            self.counts[title] += 1
+            self.sessions.setdefault(title, []).append(session_name)
+
+    def set_suggestions(self, suggestions):
+        """记录每个未匹配标题的相似已知标题"""
+        self.suggestions = suggestions
+
+    def __len__(self):
+        return len(self.counts)
+
+    def to_dataframe(self):
+        """转换为按出现次数降序排列的表格，有相似标题建议时附带最相似的SKU和其他候选"""
+        columns = ["商品名称", "出现次数", "场次"]
+        if self.suggestions:
+            columns += ["建议SKU", "相似度", "相似标题", "其他候选"]
+        rows = []
+        for title, count in self.counts.most_common():
+            row = {
+                "商品名称": title,
+                "出现次数": count,
+                "场次": ", ".join(dict.fromkeys(self.sessions[title])),
+            }
+            suggestions = self.suggestions.get(title)
+            if suggestions:
+                sku, similar_title, score = suggestions[0]
+                row.update({"建议SKU": sku, "相似度": score, "相似标题": similar_title})
+                row["其他候选"] = ", ".join(f"{s}({v})" for s, _, v in suggestions[1:])
+            rows.append(row)
+        return pd.DataFrame(rows, columns=columns)
+
+    def write(self, path=DEFAULT_REPORT_PATH):
+        """
+        一次性写出报告，只输出一条汇总日志
+        所有标题都已匹配时写出只有表头的空报告，覆盖上一次的结果
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.to_dataframe().to_csv(path, index=False, encoding="utf-8-sig")
+        if not self.counts:
+            return path
+        logger.warning(
+            f"共 {len(self.counts)} 个标题（{sum(self.counts.values())} 行）未匹配SKU，详见 {path}"
+        )
+        return path
+
+
+def read_report(path=DEFAULT_REPORT_PATH):
+    """读取最近一次写出的未匹配标题报告"""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    return pd.read_csv(path, encoding="utf-8-sig")
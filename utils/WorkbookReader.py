@@ -0,0 +1,126 @@
+import hashlib
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import pandas as pd
+from utils.SessionIndex import parse_session_name, sheet_session_name
+
+# 工作表数量达到该值时多进程并行解析
+PARALLEL_SHEETS = 8
+# 每个工作进程至少解析的工作表数量，工作表太少时启动进程的开销大于收益
+MIN_SHEETS_PER_WORKER = 4
+
+# 文件路径 -> ((文件大小, 修改时间), 工作表名称)
+_sheet_name_cache = {}
+
+
+def list_sheet_names(content):
+    """
+    按工作簿中的顺序返回工作表名称，content 为文件内容或文件路径
+    只读取 zip 中的 xl/workbook.xml，不加载共享字符串和工作表数据
+    """
+    source = io.BytesIO(content) if isinstance(content, bytes) else content
+    with zipfile.ZipFile(source) as archive:
+        root = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    # 按本地名匹配，兼容不同的命名空间
+    return [
+        element.get("name")
+        for element in root.iter()
+        if element.tag.rpartition("}")[2] == "sheet"
+    ]
+
+
+def file_sheet_names(file_path):
+    """
+    文件的工作表名称，文件大小和修改时间不变时使用上次读取的结果
+    不是有效的xlsx文件时返回空列表，按单工作表文件处理，加载时再报告错误
+    """
+    try:
+        stat = os.stat(file_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = _sheet_name_cache.get(str(file_path))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        names = list_sheet_names(file_path)
+    except (OSError, zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+        return []
+    _sheet_name_cache[str(file_path)] = (signature, names)
+    return names
+
+
+def _parse_sheets(content, sheet_names):
+    """工作进程：打开一次工作簿，依次解析一组工作表"""
+    with pd.ExcelFile(io.BytesIO(content)) as workbook:
+        return {name: workbook.parse(name) for name in sheet_names}
+
+
+def read_workbook_sheets(content, sheet_names=None, max_workers=None):
+    """
+    解析工作簿的多个工作表，返回 {工作表名称: 原始数据}，顺序与 sheet_names 一致
+    sheet_names: 需要解析的工作表，None 表示全部
+    max_workers: 工作进程数，None 表示使用CPU核数；工作表较多时按相邻工作表分组并行解析，
+                 每个进程只打开一次工作簿
+    """
+    if sheet_names is None:
+        sheet_names = list_sheet_names(content)
+    sheet_names = list(sheet_names)
+    if not sheet_names:
+        return {}
+
+    max_workers = min(
+        max_workers or os.cpu_count() or 1, len(sheet_names) // MIN_SHEETS_PER_WORKER
+    )
+    if max_workers <= 1 or len(sheet_names) < PARALLEL_SHEETS:
+        return _parse_sheets(content, sheet_names)
+
+    chunk_size = -(-len(sheet_names) // max_workers)
+    chunks = [
+        sheet_names[i : i + chunk_size] for i in range(0, len(sheet_names), chunk_size)
+    ]
+    sheets = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for parsed in executor.map(_parse_sheets, [content] * len(chunks), chunks):
+            sheets.update(parsed)
+    return sheets
+
+
+def sheet_signature(content_hash, sheet_name):
+    """工作表的内容标识：文件内容哈希加工作表名称"""
+    return hashlib.sha256(f"{content_hash}:{sheet_name}".encode("utf-8")).hexdigest()
+
+
+def is_session_sheet(df):
+    """工作表是否为场次数据：有数据行且包含商品名称列，说明、汇总等工作表会被跳过"""
+    return not df.empty and "商品名称" in df.columns
+
+
+def single_data_sheet(sheets):
+    """
+    sheets 为工作簿的全部工作表 {名称: 原始数据}
+    只有一个工作表有商品数据（另有说明页等）且其名称中没有日期时返回该工作表名称，
+    此时与单工作表文件一样以文件名作为场次名称；否则返回None
+    """
+    data_sheets = [name for name, df in sheets.items() if is_session_sheet(df)]
+    if len(data_sheets) == 1 and parse_session_name(data_sheets[0])[0] is None:
+        return data_sheets[0]
+    return None
+
+
+def workbook_sessions(file_stem, content_hash, sheets):
+    """
+    将解析后的工作簿拆分为场次：[(场次名称, 原始数据, 内容标识)]
+    只有一个工作表时整个文件为一个场次，与单工作表文件的场次名称和内容标识一致
+    """
+    if len(sheets) == 1:
+        return [(file_stem, next(iter(sheets.values())), content_hash)]
+    single = single_data_sheet(sheets)
+    if single is not None:
+        return [(file_stem, sheets[single], sheet_signature(content_hash, single))]
+    return [
+        (sheet_session_name(file_stem, name), df, sheet_signature(content_hash, name))
+        for name, df in sheets.items()
+        if is_session_sheet(df)
+    ]
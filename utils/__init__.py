@@ -1,2 +1,4 @@
 from .CustomLogger import logger
+from .SkuRuleEngine import SkuRuleEngine, get_default_engine
+from .SessionIndex import SessionIndex
 from .DataLoader import DataLoader